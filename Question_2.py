@@ -1,87 +1,30 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import matplotlib.pyplot as plt
-import numpy as np
 
+from cleandata import load_data
+from cube import get_cube, rollup
+from filters import get_filter_index
 
-##Open the data##
-# Import csv dataset & convert to pandas dataframe (df)
-df = pd.read_csv('data/Global_YouTube_Statistics.csv', encoding='latin-1')
-# Set the display.max_columns option to None to display all columns of the df
-pd.set_option('display.max_columns', None)
-
-
-## Clean the data
-# Rename columns: replace '_' with ' ' and capitalize each word
-df.columns = df.columns.str.replace('_', ' ').str.title()
-
-# Drop the 'Rank' column as it's not required
-df = df.drop(columns='Rank')
-
-# Remove duplicate rows
-df = df.drop_duplicates()
-
-# Handle missing values
-# Replace missing values in categorical columns with 'Unknown'
-categorical_columns = df.select_dtypes(include=['object']).columns
-df[categorical_columns] = df[categorical_columns].fillna('Unknown')
-
-# Replace missing values in numerical columns with 0
-numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns
-df[numerical_columns] = df[numerical_columns].fillna(0)
-
-# Remove and replace unwanted characters in 'Youtuber' and 'Title'
-import re
-pattern = r'[^a-zA-Z0-9\s.,!?&\'-]'
-df['Youtuber'] = df['Youtuber'].str.replace(pattern, '', regex=True)
-df['Title'] = df['Title'].str.replace(pattern, '', regex=True)
 
-# Trim leading/trailing whitespace
-df['Youtuber'] = df['Youtuber'].str.strip()
-df['Title'] = df['Title'].str.strip()
-
-# Remove rows with 0 video views, blank Youtuber names, and 'Created Year' as 0
-df = df[df['Video Views'] != 0]
-df = df[df['Youtuber'] != '']
-df = df[df['Created Year'] != 0]
-
-# Convert certain float columns to integers
-float_to_int_columns = [
-    'Video Views', 'Video Views Rank', 'Country Rank', 'Channel Type Rank',
-    'Video Views For The Last 30 Days', 'Subscribers For Last 30 Days',
-    'Created Year', 'Population', 'Urban Population'
-]
-df[float_to_int_columns] = df[float_to_int_columns].astype(int)
-
-# Sort by 'Subscribers' and reset index
-df = df.sort_values(by='Subscribers', ascending=False)
-df = df.reset_index(drop=True)
-
-
-# Updated Filter Function
-def filter_data_by_year_and_country(selected_countries, selected_years):
-    filter_conditions = []
-    if selected_countries:
-        filter_conditions.append(df['Country'].isin(selected_countries))
-    if selected_years:
-        filter_conditions.append(df['Created Year'].isin(selected_years))
+##Open the data##
+# Load the cleaned dataset (parsed and cleaned once per process, see cleandata.py)
+df = load_data()
+filter_index = get_filter_index(df)
+cube = get_cube(df)
 
-    if filter_conditions:
-        filtered_df = df[filter_conditions[0]]
-        for condition in filter_conditions[1:]:
-            filtered_df = filtered_df[condition]
-    else:
-        filtered_df = df
 
-    return filtered_df
+# Category Totals for the Selected Countries and Years, rolled up from the pre-aggregated cube
+def category_totals_by_year_and_country(selected_countries, selected_years):
+    return rollup(cube, 'Category', {'Country': selected_countries, 'Created Year': selected_years})
 
-# Function to get most popular categories from filtered data
+# Function to get most popular categories from the category totals
 def get_most_popular_categories(data, column='Subscribers'):
-    return data.groupby('Category').sum()[column].sort_values(ascending=False).index[0]
+    return data.loc[data[column].idxmax(), 'Category']
 
 # Pie Chart for Category Popularity by Subscribers with Updated Caption
 def plot_category_by_subscribers(data, selected_countries, selected_years):
+    # Plotly is imported on first use, after the title and filters are already on the page
+    import plotly.express as px
+
     fig = px.pie(
         data_frame=data,
         names='Category',
@@ -96,6 +39,8 @@ def plot_category_by_subscribers(data, selected_countries, selected_years):
 
 # Pie Chart for Category Popularity by Video Views with Updated Caption
 def plot_category_by_views(data, selected_countries, selected_years):
+    import plotly.express as px
+
     fig = px.pie(
         data_frame=data,
         names='Category',
@@ -110,11 +55,11 @@ def plot_category_by_views(data, selected_countries, selected_years):
 
 # Streamlit Interface for User Input
 st.title("Q2: Which YouTube Categories are Most Popular by Subscriber Count and Video Views?")
-selected_countries = st.sidebar.multiselect('Select Countries', df['Country'].unique(), default=None)
-selected_years = st.sidebar.multiselect('Select Created Year', df['Created Year'].unique(), default=None)
+selected_countries = st.sidebar.multiselect('Select Countries', filter_index.options('Country'), default=None)
+selected_years = st.sidebar.multiselect('Select Created Year', filter_index.options('Created Year'), default=None)
 
-filtered_df = filter_data_by_year_and_country(selected_countries, selected_years)
+category_totals = category_totals_by_year_and_country(selected_countries, selected_years)
 
 # Displaying the Pie Charts
-plot_category_by_subscribers(filtered_df, selected_countries, selected_years)
-plot_category_by_views(filtered_df, selected_countries, selected_years)
\ No newline at end of file
+plot_category_by_subscribers(category_totals, selected_countries, selected_years)
+plot_category_by_views(category_totals, selected_countries, selected_years)
\ No newline at end of file
@@ -0,0 +1,187 @@
+import argparse
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from cleandata import DATA_PATH, cached_per_frame, load_data, read_data
+from delta import apply_update
+from figcache import FigureCache, selection_key
+from filters import get_filter_index
+from queries import QUESTION_FILTERS, category_totals, country_category_averages, most_popular_category, top_channels
+from topk import TOPK_METRICS
+
+
+# Serialized size of the responses kept per dataset version
+RESPONSE_CACHE_BYTES = 32 * 1024 * 1024
+
+# Query parameters of the filter columns; repeat a parameter to select several values
+FILTER_PARAMETERS = {'country': 'Country', 'category': 'Category', 'year': 'Created Year'}
+
+# Columns of the channels listed by /top
+CHANNEL_COLUMNS = ['Youtuber', 'Subscribers', 'Video Views', 'Category', 'Country', 'Created Year']
+
+MAX_TOP = 1000
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def records(frame):
+    return frame.to_dict('records')
+
+# Selections of a question from the query parameters. Values arrive as text and are matched
+# against the column's values (years are numbers), so an unknown value is reported instead of
+# silently matching nothing.
+def parse_selections(df, question, query):
+    filter_index = get_filter_index(df)
+    selections = {}
+    for parameter, column in FILTER_PARAMETERS.items():
+        values = query.get(parameter, [])
+        if values and column not in QUESTION_FILTERS[question]:
+            raise BadRequest(f"'{parameter}' does not filter {question}")
+        known = {str(value): value for value in filter_index.options(column)}
+        unknown = [value for value in values if value not in known]
+        if unknown:
+            raise BadRequest(f'Unknown {parameter}: {", ".join(unknown)}')
+        selections[column] = [known[value] for value in values]
+    return selections
+
+
+## Endpoints
+# Each takes the cleaned frame and the parsed query string and returns a JSON-serializable answer
+def top_endpoint(df, query):
+    metric = query.get('metric', ['Subscribers'])[0]
+    if metric not in TOPK_METRICS:
+        raise BadRequest(f'metric must be one of {", ".join(TOPK_METRICS)}')
+    try:
+        n = int(query.get('n', ['10'])[0])
+    except ValueError:
+        raise BadRequest('n must be an integer')
+    if not 0 < n <= MAX_TOP:
+        raise BadRequest(f'n must be between 1 and {MAX_TOP}')
+    selections = parse_selections(df, 'Question 1', query)
+    return {'metric': metric, 'channels': records(top_channels(df, metric, selections, n)[CHANNEL_COLUMNS])}
+
+def categories_endpoint(df, query):
+    totals = category_totals(df, parse_selections(df, 'Question 2', query))
+    if not len(totals):
+        return {'most_popular': None, 'categories': []}
+    return {
+        'most_popular': {measure: most_popular_category(totals, measure) for measure in ['Subscribers', 'Video Views']},
+        'categories': records(totals),
+    }
+
+def countries_endpoint(df, query):
+    return {'countries': records(country_category_averages(df, parse_selections(df, 'Question 3', query)))}
+
+def options_endpoint(df, query):
+    filter_index = get_filter_index(df)
+    return {parameter: list(filter_index.options(column)) for parameter, column in FILTER_PARAMETERS.items()}
+
+
+ENDPOINTS = {
+    '/top': top_endpoint,
+    '/categories': categories_endpoint,
+    '/countries': countries_endpoint,
+    '/options': options_endpoint,
+}
+
+
+# Serialized responses per dataset version; a reloaded or updated dataset starts with an empty cache
+def new_response_cache(df):
+    return FigureCache(RESPONSE_CACHE_BYTES, size=len, name='response')
+
+
+get_response_cache = cached_per_frame(new_response_cache)
+
+
+def response_key(path, query):
+    return path, selection_key(query)
+
+def respond(df, path, query):
+    answer = ENDPOINTS[path](df, query)
+    return json.dumps(answer, default=str).encode()
+
+
+## Server
+# One thread per request (ThreadingHTTPServer). The dataset and its indexes are shared by every
+# thread and loaded before the first request; each request only looks up the prepared structures.
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 makes bursts of clients wait for a connection retry (about a second)
+    request_queue_size = 128
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/health':
+            return self.send_json(200, b'{"status": "ok"}')
+        if url.path not in ENDPOINTS:
+            return self.send_json(404, json.dumps({'error': f'Unknown endpoint {url.path}'}).encode())
+        query = parse_qs(url.query)
+        df = load_data(self.server.data_path)
+        try:
+            body = get_response_cache(df).get(response_key(url.path, query), lambda: respond(df, url.path, query))
+        except BadRequest as error:
+            return self.send_json(400, json.dumps({'error': str(error)}).encode())
+        self.send_json(200, body)
+
+    # Upsert a batch of channel rows (a CSV body in the export format) into the served dataset. The
+    # batch is applied to the frame in memory, whose indexes, orderings and cube are updated rather
+    # than rebuilt, and persisted for other processes. Updates are applied one at a time; queries
+    # keep reading the previous frame until the new one replaces it.
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/update':
+            return self.send_json(404, json.dumps({'error': f'Unknown endpoint {url.path}'}).encode())
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.update_lock:
+            try:
+                df = apply_update(read_data(io.BytesIO(body)), self.server.data_path)
+            except (ValueError, KeyError) as error:
+                return self.send_json(400, json.dumps({'error': f'Bad batch: {error}'}).encode())
+        self.send_json(200, json.dumps({'channels': len(df)}).encode())
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8000, data_path=DATA_PATH, verbose=False):
+    server = QueryServer((host, port), QueryHandler)
+    server.data_path = data_path
+    server.verbose = verbose
+    server.update_lock = threading.Lock()
+    # Load, clean and index the dataset up front so the first requests don't pay for it
+    df = load_data(data_path)
+    get_filter_index(df)
+    top_channels(df, TOPK_METRICS[0], {})
+    category_totals(df, {})
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the dashboard's questions as JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--data', default=DATA_PATH, help='CSV export to serve')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.data, args.verbose)
+    print(f'Serving on http://{args.host}:{server.server_address[1]} (endpoints: /top, /categories, /countries, /options, POST /update)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
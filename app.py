@@ -1,176 +1,321 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import numpy as np
-import re
-
-# Open the data
-df = pd.read_csv('data/Global_YouTube_Statistics.csv', encoding='latin-1')
-pd.set_option('display.max_columns', None)
-
-# Clean the data
-df.columns = df.columns.str.replace('_', ' ').str.title()
-df = df.drop(columns='Rank')
-df = df.drop_duplicates()
-categorical_columns = df.select_dtypes(include=['object']).columns
-df[categorical_columns] = df[categorical_columns].fillna('Unknown')
-numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns
-df[numerical_columns] = df[numerical_columns].fillna(0)
-pattern = r'[^a-zA-Z0-9\s.,!?&\'-]'
-df['Youtuber'] = df['Youtuber'].str.replace(pattern, '', regex=True)
-df['Title'] = df['Title'].str.replace(pattern, '', regex=True)
-df['Youtuber'] = df['Youtuber'].str.strip()
-df['Title'] = df['Title'].str.strip()
-df = df[df['Video Views'] != 0]
-df = df[df['Youtuber'] != '']
-df = df[df['Created Year'] != 0]
-float_to_int_columns = ['Video Views', 'Video Views Rank', 'Country Rank', 'Channel Type Rank',
-                        'Video Views For The Last 30 Days', 'Subscribers For Last 30 Days',
-                        'Created Year', 'Population', 'Urban Population']
-df[float_to_int_columns] = df[float_to_int_columns].astype(int)
-df = df.sort_values(by='Subscribers', ascending=False)
-df = df.reset_index(drop=True)
+
+from cleandata import load_data
+from cube import get_cube
+from diagnostics import Rerun
+from figcache import get_figure_cache, selection_key
+from filters import get_filter_index
+from queries import (approximate_category_totals, approximate_country_category_averages, approximate_top_channels, category_totals,
+                     channel_standing, compact_category_totals, compact_country_category_averages, country_category_averages,
+                     country_map, most_popular_category, search_channels, top_channels, top_earners)
+from ranking import RANKED_METRICS, get_rank_table
+from spatial import MAP_MEASURES, PER_CAPITA, get_country_locations, located
+from topk import get_topk
+
+# Opt-in timing of this rerun (YT_DIAGNOSTICS=1 or the sidebar toggle, see diagnostics.py)
+rerun = Rerun.start(st.session_state)
+
+# Open the cleaned data (parsed and cleaned once per process, see cleandata.py)
+with rerun.phase('load data') as details:
+    df = load_data()
+    details['rows'] = len(df)
+# The structures the questions are answered from are built once per cleaned frame (see queries.py)
+with rerun.phase('build structures'):
+    filter_index = get_filter_index(df)
+    cube = get_cube(df)
+    get_topk(df)
+    get_rank_table(df)
+    get_country_locations(df)
+    figures = get_figure_cache(df)
 
 # Create Interface
 st.set_page_config(layout="wide")
+
+# Channel search: matching channels and their rank, shown above the selected question
+search = st.sidebar.text_input('Search channels', key='search', placeholder='Name or title, e.g. MrBeast')
+found = None
+if search.strip():
+    with rerun.phase('search') as details:
+        found = search_channels(df, search)
+        details['matches'] = len(found)
+    st.subheader(f'Channels matching "{search.strip()}"')
+    if len(found):
+        st.dataframe(found, hide_index=True)
+    else:
+        st.caption('No channel name or title is close to this search.')
+
 st.sidebar.title("Filters")
 
 # Sidebar for selecting visualization
-vis = st.sidebar.radio("Select Your Question:", options=["Question 1", "Question 2", "Question 3"])
+vis = st.sidebar.radio("Select Your Question:", options=["Question 1", "Question 2", "Question 3", "Question 4", "Question 5"])
+rerun.question = vis
+approximate = st.sidebar.toggle('Approximate answers', key='approximate',
+                                help='Answer from a fixed-size sample of every country, category and year, with 95% error bounds')
+
+
+# Caption giving the largest relative error of the estimates in an approximate answer
+def error_note(data, column):
+    error = (data[f'{column} Error'] / data[column].where(data[column] > 0)).max()
+    if not error > 0:
+        return "Approximate answer: exact here, as every selected group was small enough to be sampled whole."
+    return f"Approximate answer: every {column.lower()} figure is estimated within ±{error:.1%} (95% confidence)."
+
 
 # Question 1 Code
 if vis == "Question 1":
     st.title("Who are the Top 10 YouTubers in Terms of Subscribers and the Top 10 YouTubers with the Highest Views?")
-    selected_countries = st.sidebar.multiselect('Select Countries', df['Country'].unique(), default=None)
-    selected_categories = st.sidebar.multiselect('Select Categories', df['Category'].unique(), default=None)
-
-    def filter_data(selected_countries, selected_categories):
-        if selected_countries and selected_categories:
-            filtered_df = df[df['Country'].isin(selected_countries) & df['Category'].isin(selected_categories)]
-        elif selected_countries:
-            filtered_df = df[df['Country'].isin(selected_countries)]
-        elif selected_categories:
-            filtered_df = df[df['Category'].isin(selected_categories)]
-        else:
-            filtered_df = df
-        return filtered_df
+    selected_countries = st.sidebar.multiselect('Select Countries', filter_index.options('Country'), default=None)
+    selected_categories = st.sidebar.multiselect('Select Categories', filter_index.options('Category'), default=None)
 
-    filtered_df = filter_data(selected_countries, selected_categories)
+    selections = {'Country': selected_countries, 'Category': selected_categories}
+    selection = (approximate, selection_key(selections))
 
-    top_subscribers = filtered_df.sort_values(by='Subscribers', ascending=False).head(10)
-    top_views = filtered_df.sort_values(by='Video Views', ascending=False).head(10)
+    # Top 10 of one metric as a bar chart; built once per selection and shared by every session
+    def top_10_figure(metric, title):
+        # Plotly is imported when a figure is first built, not on startup or for cached figures
+        import plotly.express as px
+
+        with rerun.phase(f'top 10 by {metric}') as details:
+            top = (approximate_top_channels if approximate else top_channels)(df, metric, selections)
+            # Only counted when diagnostics are on; the approximate answer doesn't look at the rows
+            if rerun.enabled and not approximate:
+                details['rows'] = filter_index.size(selections)
+        return px.bar(
+            top,
+            x='Youtuber',
+            y=metric,
+            color=metric,
+            title=title
+        )
 
     # Plot for Top 10 YouTubers by Subscribers
-    fig_subscribers = px.bar(
-        top_subscribers,
-        x='Youtuber',
-        y='Subscribers',
-        color='Subscribers',
-        title='Top 10 YouTubers in Terms of Number of Subscribers'
-    )
-    st.plotly_chart(fig_subscribers)
+    fig_subscribers = figures.get(('Question 1', 'top subscribers', selection),
+                                  lambda: top_10_figure('Subscribers', 'Top 10 YouTubers in Terms of Number of Subscribers'))
+    rerun.chart('top subscribers', fig_subscribers)
 
     # Plot for Top 10 YouTubers by Video Views
-    fig_views = px.bar(
-        top_views,
-        x='Youtuber',
-        y='Video Views',
-        color='Video Views',
-        title='Top 10 YouTubers in Terms of Views (in billions)'
-    )
-    st.plotly_chart(fig_views)
+    fig_views = figures.get(('Question 1', 'top views', selection),
+                            lambda: top_10_figure('Video Views', 'Top 10 YouTubers in Terms of Views (in billions)'))
+    rerun.chart('top views', fig_views)
 
 
 # Question 2 Code
 elif vis == "Question 2":
     st.title("Which YouTube Categories are Most Popular by Subscriber Count and Video Views?")
 
-    selected_countries_q2 = st.sidebar.multiselect('Select Countries', df['Country'].unique(), default=None, key='selected_countries_q2')
-    selected_years_q2 = st.sidebar.multiselect('Select Created Year', df['Created Year'].unique(), default=None, key='selected_years_q2')
+    selected_countries_q2 = st.sidebar.multiselect('Select Countries', filter_index.options('Country'), default=None, key='selected_countries_q2')
+    selected_years_q2 = st.sidebar.multiselect('Select Created Year', filter_index.options('Created Year'), default=None, key='selected_years_q2')
 
-    def filter_data_by_year_and_country(selected_countries, selected_years):
-        filter_conditions = []
-        if selected_countries:
-            filter_conditions.append(df['Country'].isin(selected_countries))
-        if selected_years:
-            filter_conditions.append(df['Created Year'].isin(selected_years))
+    def category_totals_by_year_and_country(selected_countries, selected_years):
+        totals = approximate_category_totals if approximate else category_totals
+        return totals(df, {'Country': selected_countries, 'Created Year': selected_years})
 
-        if filter_conditions:
-            filtered_df = df[filter_conditions[0]]
-            for condition in filter_conditions[1:]:
-                filtered_df = filtered_df[condition]
-        else:
-            filtered_df = df
+    def get_most_popular_categories(data, column='Subscribers'):
+        return most_popular_category(data, column)
 
-        return filtered_df
+    compact_q2 = st.sidebar.toggle('Compact charts', key='compact_charts', help='Draw the largest categories and merge the rest into "Other"')
 
-    def get_most_popular_categories(data, column='Subscribers'):
-        return data.groupby('Category').sum()[column].sort_values(ascending=False).index[0]
+    selection_q2 = (approximate, selection_key({'Country': selected_countries_q2, 'Created Year': selected_years_q2}))
 
-    def plot_category_by_subscribers(data, selected_countries, selected_years):
-        fig = px.pie(
+    # Data drawn by the pies; the captions are always computed from every category
+    def chart_data_q2(data):
+        return compact_category_totals(data) if compact_q2 else data
+
+    def category_pie(data, values, title):
+        import plotly.express as px
+
+        return px.pie(
             data_frame=data,
             names='Category',
-            values='Subscribers',
-            title='Distribution of Subscribers Across Categories'
+            values=values,
+            title=title
         )
-        st.plotly_chart(fig)
+
+    def plot_category_by_subscribers(data, selected_countries, selected_years):
+        fig = figures.get(('Question 2', 'subscribers by category', compact_q2, selection_q2),
+                          lambda: category_pie(chart_data_q2(data), 'Subscribers', 'Distribution of Subscribers Across Categories'))
+        rerun.chart('subscribers by category', fig)
         most_popular_category = get_most_popular_categories(data, 'Subscribers')
         countries_text = ', '.join(selected_countries) if selected_countries else 'All countries'
         years_text = ', '.join(map(str, selected_years)) if selected_years else 'all creation years'
         st.caption(f"The most popular category by subscribers, considering the selected countries of **{countries_text}**, across **{years_text}**, is '{most_popular_category}'.")
+        if approximate and len(data):
+            st.caption(error_note(data, 'Subscribers'))
 
     def plot_category_by_views(data, selected_countries, selected_years):
-        fig = px.pie(
-            data_frame=data,
-            names='Category',
-            values='Video Views',
-            title='Distribution of Video Views Across Categories'
-        )
-        st.plotly_chart(fig)
+        fig = figures.get(('Question 2', 'views by category', compact_q2, selection_q2),
+                          lambda: category_pie(chart_data_q2(data), 'Video Views', 'Distribution of Video Views Across Categories'))
+        rerun.chart('views by category', fig)
         most_popular_category = get_most_popular_categories(data, 'Video Views')
         countries_text = ', '.join(selected_countries) if selected_countries else 'All countries'
         years_text = ', '.join(map(str, selected_years)) if selected_years else 'all creation years'
         st.caption(f"The most popular category by video views, considering the selected countries of **{countries_text}**, across **{years_text}**, is '{most_popular_category}'.")
+        if approximate and len(data):
+            st.caption(error_note(data, 'Video Views'))
 
-    filtered_df_q2 = filter_data_by_year_and_country(selected_countries_q2, selected_years_q2)
+    with rerun.phase('category rollup') as details:
+        category_totals_q2 = category_totals_by_year_and_country(selected_countries_q2, selected_years_q2)
+        if not approximate:
+            details['rows'] = len(cube)
 
-    plot_category_by_subscribers(filtered_df_q2, selected_countries_q2, selected_years_q2)
-    plot_category_by_views(filtered_df_q2, selected_countries_q2, selected_years_q2)
+    plot_category_by_subscribers(category_totals_q2, selected_countries_q2, selected_years_q2)
+    plot_category_by_views(category_totals_q2, selected_countries_q2, selected_years_q2)
 
 # Question 3 Code
 elif vis == "Question 3":
     st.title("How Does Subscriber Count Vary Across Different Countries?")
 
-    selected_categories_q3 = st.sidebar.multiselect('Select Categories', df['Category'].unique(), default=None, key='selected_categories_q3')
-    sorted_years = sorted(df['Created Year'].unique())
+    selected_categories_q3 = st.sidebar.multiselect('Select Categories', filter_index.options('Category'), default=None, key='selected_categories_q3')
+    sorted_years = sorted(filter_index.options('Created Year'))
     selected_years_q3 = st.sidebar.multiselect('Select Year of Channel Creation', sorted_years, default=None, key='selected_years_q3')
+    compact_q3 = st.sidebar.toggle('Compact charts', key='compact_charts', help='Draw the largest countries and categories and merge the rest into "Other"')
+    webgl_q3 = st.sidebar.toggle('Draw with WebGL', key='webgl_q3', help='Draw markers with WebGL instead of SVG bars, for many countries')
 
-    def filter_data_by_category_and_year(selected_categories, selected_years):
-        filtered_df = df.copy()
-        if selected_categories:
-            filtered_df = filtered_df[filtered_df['Category'].isin(selected_categories)]
-        if selected_years:
-            filtered_df = filtered_df[filtered_df['Created Year'].isin(selected_years)]
-        return filtered_df
+    def country_category_totals_by_category_and_year(selected_categories, selected_years):
+        averages = approximate_country_category_averages if approximate else country_category_averages
+        return averages(df, {'Category': selected_categories, 'Created Year': selected_years})
 
-    def plot_subscriber_count_by_country(data, selected_categories, selected_years):
-        grouped_data = data.groupby(['Country', 'Category'])['Subscribers'].mean().reset_index()
-        fig = px.bar(
-            grouped_data,
-            x='Country',
-            y='Subscribers',
-            color='Category',
-            barmode='group',
-            title='Average Subscriber Count Across Different Countries by Category'
-        )
+    # Grouped bars, or one WebGL marker per bar (Plotly has no WebGL bar trace). The compact mode
+    # keeps the largest countries and categories, so the figure holds a bounded number of marks.
+    def subscriber_count_by_country_figure(data, compact, webgl):
+        import plotly.express as px
+
+        category_orders = {}
+        if compact:
+            data = compact_country_category_averages(data)
+            category_orders['Country'] = list(dict.fromkeys(data['Country']))
+        # Approximate answers draw their confidence intervals (not kept when collapsing into 'Other')
+        error = 'Average Subscribers Error' if 'Average Subscribers Error' in data else None
+        if webgl:
+            fig = px.scatter(
+                data,
+                x='Country',
+                y='Average Subscribers',
+                color='Category',
+                category_orders=category_orders,
+                error_y=error,
+                render_mode='webgl',
+                title='Average Subscriber Count Across Different Countries by Category'
+            )
+        else:
+            fig = px.bar(
+                data,
+                x='Country',
+                y='Average Subscribers',
+                color='Category',
+                barmode='group',
+                category_orders=category_orders,
+                error_y=error,
+                title='Average Subscriber Count Across Different Countries by Category'
+            )
         fig.update_layout(xaxis_title='Country', yaxis_title='Average Subscribers')
-        st.plotly_chart(fig)
+        return fig
+
+    def plot_subscriber_count_by_country(data, selected_categories, selected_years):
+        selection = (approximate, selection_key({'Category': selected_categories, 'Created Year': selected_years}))
+        fig = figures.get(('Question 3', 'subscribers by country', compact_q3, webgl_q3, selection),
+                          lambda: subscriber_count_by_country_figure(data, compact_q3, webgl_q3))
+        rerun.chart('subscribers by country', fig)
 
         categories_text = ', '.join(selected_categories) if selected_categories else 'all categories'
         years_text = ', '.join(map(str, selected_years)) if selected_years else 'all years'
         st.caption(f"This chart illustrates the average subscriber count across various countries for **{categories_text}**, considering channels created in **{years_text}**. It highlights how audience preferences and channel popularity vary geographically and categorically.")
+        if approximate and len(data):
+            st.caption(error_note(data, 'Average Subscribers'))
+
+    with rerun.phase('country x category rollup') as details:
+        country_category_totals_q3 = country_category_totals_by_category_and_year(selected_categories_q3, selected_years_q3)
+        if not approximate:
+            details['rows'] = len(cube)
+    plot_subscriber_count_by_country(country_category_totals_q3, selected_categories_q3, selected_years_q3)
+
+# Question 4 Code
+elif vis == "Question 4":
+    st.title("Which YouTubers Earn the Most, and Where Does a Channel Rank in Its Country and Category?")
+
+    metric_q4 = st.sidebar.selectbox('Select Metric', RANKED_METRICS, key='metric_q4')
+    selected_countries_q4 = st.sidebar.multiselect('Select Countries', filter_index.options('Country'), default=None, key='selected_countries_q4')
+    selected_categories_q4 = st.sidebar.multiselect('Select Categories', filter_index.options('Category'), default=None, key='selected_categories_q4')
+    selections_q4 = {'Country': selected_countries_q4, 'Category': selected_categories_q4}
+
+    # Ranks and percentiles are precomputed per country and category (see ranking.py), so these are
+    # exact whether or not approximate answers are on
+    with rerun.phase(f'top 10 by {metric_q4}') as details:
+        top_q4 = top_earners(df, metric_q4, selections_q4)
+        details['channels'] = len(top_q4)
+
+    def top_earners_figure(data, metric):
+        import plotly.express as px
+
+        return px.bar(
+            data,
+            x='Youtuber',
+            y=metric,
+            color=metric,
+            title=f'Top 10 YouTubers by {metric}'
+        )
+
+    fig_q4 = figures.get(('Question 4', 'top earners', metric_q4, selection_key(selections_q4)),
+                         lambda: top_earners_figure(top_q4, metric_q4))
+    rerun.chart('top earners', fig_q4)
+
+    # Channels to look up (rows of the frame): the sidebar search's matches, or the top 10 above
+    candidates = list(found['Rank'] - 1) if found is not None and len(found) else list(top_q4.index)
+    if candidates:
+        row = st.selectbox('Where does this channel rank?', candidates, key='channel_q4',
+                           format_func=lambda row: f"{df['Youtuber'].iat[row]} (#{row + 1} by subscribers)",
+                           help='Search in the sidebar to look up other channels')
+        with rerun.phase('channel standing'):
+            standing = channel_standing(df, row)
+        st.dataframe(standing, hide_index=True)
+        st.caption(f"Ranks count from the largest value within the channel's country (**{df['Country'].iat[row]}**) and "
+                   f"category (**{df['Category'].iat[row]}**); equal values share a rank. The percentile is the share of "
+                   f"those channels it ranks at or above.")
+
+# Question 5 Code
+elif vis == "Question 5":
+    st.title("Where in the World Are the Biggest YouTube Audiences?")
+
+    selected_categories_q5 = st.sidebar.multiselect('Select Categories', filter_index.options('Category'), default=None, key='selected_categories_q5')
+    selected_years_q5 = st.sidebar.multiselect('Select Year of Channel Creation', sorted(filter_index.options('Created Year')), default=None, key='selected_years_q5')
+    measures_q5 = MAP_MEASURES + [column for column, _ in PER_CAPITA.values()]
+    measure_q5 = st.sidebar.selectbox('Size Markers By', measures_q5, key='measure_q5')
+    selections_q5 = {'Category': selected_categories_q5, 'Created Year': selected_years_q5}
+
+    # One marker per country, rolled up from the cube (see spatial.py)
+    with rerun.phase('country bins') as details:
+        bins_q5 = country_map(df, selections_q5)
+        details['rows'] = len(cube)
+
+    def country_map_figure(data, measure):
+        import plotly.express as px
+
+        return px.scatter_geo(
+            data,
+            lat='Latitude',
+            lon='Longitude',
+            size=measure,
+            color=measure,
+            hover_name='Country',
+            hover_data={'Latitude': False, 'Longitude': False, 'Subscribers': True, 'Video Views': True, 'Channels': True,
+                        'Subscribers per Person': ':.2f', 'Channels per Million People': ':.2f'},
+            projection='natural earth',
+            title=f'{measure} by Country'
+        )
 
-    filtered_df_q3 = filter_data_by_category_and_year(selected_categories_q3, selected_years_q3)
-    plot_subscriber_count_by_country(filtered_df_q3, selected_categories_q3, selected_years_q3)
+    on_map = located(bins_q5)
+    if len(on_map):
+        fig_q5 = figures.get(('Question 5', 'country map', measure_q5, selection_key(selections_q5)),
+                             lambda: country_map_figure(on_map, measure_q5))
+        rerun.chart('country map', fig_q5)
+    else:
+        st.info('No channel of the selected categories and years has a known location.')
+    categories_text = ', '.join(selected_categories_q5) if selected_categories_q5 else 'all categories'
+    years_text = ', '.join(map(str, selected_years_q5)) if selected_years_q5 else 'all years'
+    unlocated = int(bins_q5['Channels'].sum() - on_map['Channels'].sum())
+    st.caption(f"Markers are placed at each country's centre and sized by {measure_q5.lower()} for **{categories_text}**, considering channels created in **{years_text}**. "
+               f"Per-person figures divide by the country's population."
+               + (f" Channels without a known location ({unlocated}) are not shown." if unlocated else ""))
 
+rerun.sidebar_controls()
+rerun.finish()
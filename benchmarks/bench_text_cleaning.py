@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import textclean
+from cleandata import DATA_PATH, pattern, read_data, rename_columns
+
+
+# The regex cleanup textclean.py replaces: a replace and a strip pass per column
+def regex_clean(series):
+    return series.str.replace(pattern, '', regex=True).str.strip()
+
+def timed(function, series):
+    start = time.perf_counter()
+    result = function(series)
+    return result, time.perf_counter() - start
+
+# Raw 'Youtuber' and 'Title' values of the bundled file, repeated to `rows` rows. With unique=True
+# every value gets a distinct suffix (including characters the cleanup removes), so nothing repeats.
+def sample_text(rows, unique):
+    raw = rename_columns(read_data(DATA_PATH))[['Youtuber', 'Title']].fillna('Unknown')
+    sample = raw.iloc[np.arange(rows) % len(raw)].reset_index(drop=True)
+    if unique:
+        suffix = pd.Series(np.arange(rows)).astype(str).radd(' ★')
+        sample = sample.apply(lambda column: column + suffix)
+    return sample
+
+# The Python pass textclean.py falls back to without pyarrow
+def fallback_clean(series):
+    arrow, textclean.pa = textclean.pa, None
+    try:
+        return textclean.normalize_series(series)
+    finally:
+        textclean.pa = arrow
+
+def run(rows, unique):
+    sample = sample_text(rows, unique)
+    # The memo is filled by the cold run and reused by the warm one, like two loads of one source
+    memo = {}
+    results = {}
+    for label, function in [('regex', regex_clean), ('arrow cold', lambda series: textclean.normalize_series(series, memo)),
+                            ('arrow warm', lambda series: textclean.normalize_series(series, memo)), ('fallback', fallback_clean)]:
+        total = 0
+        for column in sample.columns:
+            cleaned, seconds = timed(function, sample[column])
+            assert cleaned.astype(object).equals(regex_clean(sample[column])), f'{label} differs on {column}'
+            total += seconds
+        results[label] = total
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare textclean.py with the regex cleanup of Youtuber and Title.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[995, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    labels = ['regex', 'arrow cold', 'arrow warm', 'fallback']
+    print(f"{'rows':>10} {'values':>8} " + ' '.join(f'{label:>14}' for label in labels))
+    for rows in args.rows:
+        for unique in (False, True):
+            results = run(rows, unique)
+            print(f"{rows:>10} {'unique' if unique else 'repeated':>8} " + ' '.join(f'{results[label]:>13.3f}s' for label in labels))
@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import FILTER_PARAMETERS, make_server
+from cleandata import DATA_PATH, load_data
+from filters import get_filter_index
+
+
+# A request mix like the dashboard's traffic: mostly unfiltered views, the rest filtered on one or
+# two popular values
+def request_paths(data_path, count, seed=0):
+    rng = random.Random(seed)
+    filter_index = get_filter_index(load_data(data_path))
+    popular = {parameter: [str(value) for value in filter_index.options(column)[:8]] for parameter, column in FILTER_PARAMETERS.items()}
+    endpoints = {'/top': ['country', 'category'], '/categories': ['country', 'year'], '/countries': ['category', 'year']}
+    paths = []
+    for _ in range(count):
+        endpoint = rng.choice(list(endpoints))
+        query = {'metric': rng.choice(['Subscribers', 'Video Views'])} if endpoint == '/top' else {}
+        if rng.random() < 0.5:
+            parameter = rng.choice(endpoints[endpoint])
+            query[parameter] = rng.sample(popular[parameter], rng.randint(1, 2))
+        paths.append(endpoint + ('?' + urlencode(query, doseq=True) if query else ''))
+    return paths
+
+def fetch(url):
+    start = time.perf_counter()
+    with urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+# Send requests from `concurrency` client threads and report throughput and latency percentiles.
+# Without --url a server is started in this process on a free port, against the bundled data.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the JSON query API.')
+    parser.add_argument('--url', help='base URL of a running api.py (default: start one here)')
+    parser.add_argument('--data', default=DATA_PATH, help='dataset of the server started here')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = make_server(port=0, data_path=args.data)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    paths = request_paths(args.data, args.requests)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = sorted(pool.map(fetch, [url.rstrip('/') + path for path in paths]))
+    elapsed = time.perf_counter() - start
+
+    percentile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f'{len(latencies)} requests, {args.concurrency} clients: {len(latencies) / elapsed:.0f} requests/sec')
+    print(f'latency ms: mean {statistics.mean(latencies) * 1000:.2f}, p50 {percentile(0.5):.2f}, '
+          f'p95 {percentile(0.95):.2f}, p99 {percentile(0.99):.2f}')
+    if server is not None:
+        server.shutdown()
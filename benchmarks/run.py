@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import plotly.express as px
+
+from cleandata import CLEANING_STEPS, DATA_PATH, read_data
+from cube import build_cube, rollup
+from filters import FilterIndex
+from queries import compact_category_totals, compact_country_category_averages
+from ranking import RankTable
+from search import SearchIndex
+from spatial import build_country_locations, country_bins
+from synopsis import Synopsis
+from synthetic import write_raw
+from topk import TopK
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'results.json')
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Synthetic dataset sizes run besides the bundled file
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+# Calls averaged for stages that answer a single dashboard interaction
+QUERY_CALLS = 100
+
+
+## Stages
+# Every stage reads what earlier stages left in the context and stores its own result there.
+# Stages answering one click run QUERY_CALLS times and report the time per call.
+def most_common(df, column, count):
+    return list(df[column].value_counts().index[:count])
+
+def stage_read(ctx):
+    ctx['df'] = read_data(ctx['path'])
+
+def cleaning_stage(step):
+    def stage(ctx):
+        ctx['df'] = step(ctx['df'])
+    return stage
+
+def stage_filter_index(ctx):
+    df = ctx['df']
+    ctx['index'] = FilterIndex.build(df)
+    # The selections the queries below answer: popular values, as users tend to pick
+    ctx['countries'] = most_common(df, 'Country', 2)
+    ctx['categories'] = most_common(df, 'Category', 2)
+    ctx['years'] = most_common(df, 'Created Year', 3)
+
+def stage_filter_q1(ctx):
+    ctx['index'].select({'Country': ctx['countries'], 'Category': ctx['categories']})
+
+def stage_filter_q2(ctx):
+    ctx['index'].select({'Country': ctx['countries'], 'Created Year': ctx['years']})
+
+def stage_filter_q3(ctx):
+    ctx['index'].select({'Category': ctx['categories'], 'Created Year': ctx['years']})
+
+def stage_topk(ctx):
+    ctx['topk'] = TopK.build(ctx['df'], ctx['index'])
+
+def stage_top10(ctx):
+    selections = {'Country': ctx['countries'], 'Category': ctx['categories']}
+    ctx['top_subscribers'] = ctx['topk'].top_frame(ctx['df'], 'Subscribers', 10, selections)
+    ctx['top_views'] = ctx['topk'].top_frame(ctx['df'], 'Video Views', 10, selections)
+
+def stage_cube(ctx):
+    ctx['cube'] = build_cube(ctx['df'])
+
+def stage_q2_rollup(ctx):
+    ctx['q2'] = rollup(ctx['cube'], 'Category', {'Country': ctx['countries'], 'Created Year': ctx['years']})
+
+def stage_q3_rollup(ctx):
+    ctx['q3'] = rollup(ctx['cube'], ['Country', 'Category'], {'Category': ctx['categories'], 'Created Year': ctx['years']})
+
+# Figures are built and serialized the way st.plotly_chart sends them; the payload size is recorded
+def stage_q1_figures(ctx):
+    figures = [px.bar(ctx['top_subscribers'], x='Youtuber', y='Subscribers', color='Subscribers'),
+               px.bar(ctx['top_views'], x='Youtuber', y='Video Views', color='Video Views')]
+    return {'payload_bytes': sum(len(figure.to_json()) for figure in figures)}
+
+def stage_q2_figures(ctx):
+    figures = [px.pie(ctx['q2'], names='Category', values='Subscribers'),
+               px.pie(ctx['q2'], names='Category', values='Video Views')]
+    return {'payload_bytes': sum(len(figure.to_json()) for figure in figures)}
+
+def stage_q3_figure(ctx):
+    figure = px.bar(ctx['q3'], x='Country', y='Average Subscribers', color='Category', barmode='group')
+    return {'payload_bytes': len(figure.to_json())}
+
+# The approximate mode answers from a synopsis whose size doesn't grow with the rows
+def stage_synopsis(ctx):
+    ctx['synopsis'] = Synopsis.build(ctx['df'])
+
+def stage_q1_approximate(ctx):
+    ctx['synopsis'].top('Subscribers', {'Country': ctx['countries'], 'Category': ctx['categories']})
+
+def stage_q2_approximate(ctx):
+    ctx['synopsis'].rollup('Category', {'Country': ctx['countries'], 'Created Year': ctx['years']})
+
+def stage_q3_approximate(ctx):
+    ctx['synopsis'].rollup(['Country', 'Category'], {'Category': ctx['categories'], 'Created Year': ctx['years']})
+
+# Earnings ranks: a channel's standing in its country and category, and the top earners of a filter
+def stage_rank_table(ctx):
+    ctx['ranks'] = RankTable.build(ctx['df'], ctx['index'])
+
+def stage_channel_standing(ctx):
+    ctx['ranks'].standing(len(ctx['df']) // 2)
+
+def stage_top_earners(ctx):
+    ctx['ranks'].top_rows('Highest Yearly Earnings', 10, {'Country': ctx['countries'], 'Category': ctx['categories']})
+
+# Map: one bin per country rolled up from the cube, and the scatter_geo figure drawn from the bins
+def stage_country_locations(ctx):
+    ctx['locations'] = build_country_locations(ctx['df'])
+
+def stage_map_bins(ctx):
+    ctx['q5'] = country_bins(ctx['cube'], ctx['locations'], {'Category': ctx['categories'], 'Created Year': ctx['years']})
+
+def stage_map_figure(ctx):
+    bins = ctx['q5'][ctx['q5']['Latitude'].notna()]
+    figure = px.scatter_geo(bins, lat='Latitude', lon='Longitude', size='Subscribers', color='Subscribers', hover_name='Country')
+    return {'payload_bytes': len(figure.to_json())}
+
+# Channel search: a name as typed from its start, and one with a typo that only the trigrams find
+def stage_search_index(ctx):
+    ctx['search'] = SearchIndex.build(ctx['df'])
+    ctx['search_name'] = str(ctx['df']['Youtuber'].iloc[len(ctx['df']) // 2]).lower()
+
+def stage_search_prefix(ctx):
+    ctx['search'].search(ctx['search_name'][:4])
+
+def stage_search_fuzzy(ctx):
+    name = ctx['search_name']
+    ctx['search'].search(name[:1] + name[2:])
+
+# The compact rendering mode against the full charts for the unfiltered view, the most requested
+# one. Rolling up and collapsing into 'Other' are part of what each chart costs.
+def stage_q2_figures_all(ctx):
+    totals = rollup(ctx['cube'], 'Category')
+    figures = [px.pie(totals, names='Category', values='Subscribers'),
+               px.pie(totals, names='Category', values='Video Views')]
+    return {'payload_bytes': sum(len(figure.to_json()) for figure in figures)}
+
+def stage_q2_figures_compact(ctx):
+    totals = compact_category_totals(rollup(ctx['cube'], 'Category'))
+    figures = [px.pie(totals, names='Category', values='Subscribers'),
+               px.pie(totals, names='Category', values='Video Views')]
+    return {'payload_bytes': sum(len(figure.to_json()) for figure in figures)}
+
+def stage_q3_figure_all(ctx):
+    averages = rollup(ctx['cube'], ['Country', 'Category'])
+    figure = px.bar(averages, x='Country', y='Average Subscribers', color='Category', barmode='group')
+    return {'payload_bytes': len(figure.to_json())}
+
+def stage_q3_figure_compact(ctx):
+    averages = compact_country_category_averages(rollup(ctx['cube'], ['Country', 'Category']))
+    figure = px.bar(averages, x='Country', y='Average Subscribers', color='Category', barmode='group')
+    return {'payload_bytes': len(figure.to_json())}
+
+def stage_q3_figure_webgl(ctx):
+    averages = rollup(ctx['cube'], ['Country', 'Category'])
+    figure = px.scatter(averages, x='Country', y='Average Subscribers', color='Category', render_mode='webgl')
+    return {'payload_bytes': len(figure.to_json())}
+
+
+# (name, function, calls) in the order of the dashboard's flow
+STAGES = (
+    [('read_csv', stage_read, 1)]
+    + [(f'clean: {step.__name__}', cleaning_stage(step), 1) for step in CLEANING_STEPS]
+    + [
+        ('filter index: build', stage_filter_index, 1),
+        ('filter: country + category (Q1)', stage_filter_q1, QUERY_CALLS),
+        ('filter: country + year (Q2)', stage_filter_q2, QUERY_CALLS),
+        ('filter: category + year (Q3)', stage_filter_q3, QUERY_CALLS),
+        ('top-k: build', stage_topk, 1),
+        ('top-k: top 10 (Q1)', stage_top10, QUERY_CALLS),
+        ('cube: build', stage_cube, 1),
+        ('cube: category rollup (Q2)', stage_q2_rollup, QUERY_CALLS),
+        ('cube: country x category rollup (Q3)', stage_q3_rollup, QUERY_CALLS),
+        ('approximate: build synopsis', stage_synopsis, 1),
+        ('approximate: top 10 (Q1)', stage_q1_approximate, QUERY_CALLS),
+        ('approximate: category rollup (Q2)', stage_q2_approximate, QUERY_CALLS),
+        ('approximate: country x category rollup (Q3)', stage_q3_approximate, QUERY_CALLS),
+        ('ranks: build', stage_rank_table, 1),
+        ('ranks: channel standing (Q4)', stage_channel_standing, QUERY_CALLS),
+        ('ranks: top earners (Q4)', stage_top_earners, QUERY_CALLS),
+        ('search: build index', stage_search_index, 1),
+        ('search: prefix', stage_search_prefix, QUERY_CALLS),
+        ('search: typo', stage_search_fuzzy, QUERY_CALLS),
+        ('map: country locations', stage_country_locations, 1),
+        ('map: country bins (Q5)', stage_map_bins, QUERY_CALLS),
+        ('figures: Q1 bars', stage_q1_figures, 1),
+        ('figures: Q2 pies', stage_q2_figures, 1),
+        ('figures: Q3 bars', stage_q3_figure, 1),
+        ('figures: Q5 map', stage_map_figure, 1),
+        ('figures: Q2 pies, all countries', stage_q2_figures_all, 1),
+        ('figures: Q2 pies, all countries (compact)', stage_q2_figures_compact, 1),
+        ('figures: Q3 bars, all categories', stage_q3_figure_all, 1),
+        ('figures: Q3 bars, all categories (compact)', stage_q3_figure_compact, 1),
+        ('figures: Q3 markers, all categories (WebGL)', stage_q3_figure_webgl, 1),
+    ]
+)
+
+
+## Running
+# Run every stage once for timing and, unless skipped, a second time under tracemalloc for the
+# peak memory each stage allocates (kept apart so the tracing overhead doesn't skew the timings).
+# tracemalloc sees Python and numpy allocations; Arrow buffers are allocated outside of it.
+def run_dataset(name, path, rows, memory=True):
+    results = {stage: {'dataset': name, 'rows': rows, 'stage': stage} for stage, _, _ in STAGES}
+    ctx = {'path': path}
+    for stage, function, calls in STAGES:
+        start = time.perf_counter()
+        for _ in range(calls):
+            extra = function(ctx)
+        results[stage]['seconds'] = (time.perf_counter() - start) / calls
+        results[stage].update(extra or {})
+    if memory:
+        ctx = {'path': path}
+        tracemalloc.start()
+        for stage, function, _ in STAGES:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            function(ctx)
+            results[stage]['peak_bytes'] = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+    return list(results.values())
+
+def run(sizes, memory=True):
+    records = run_dataset('bundled', DATA_PATH, len(read_data(DATA_PATH)), memory)
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            path = write_raw(rows, os.path.join(directory, f'synthetic_{rows}.csv'))
+            records += run_dataset(f'synthetic {rows}', path, rows, memory)
+            os.remove(path)
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': records,
+    }
+
+
+## Comparing against a baseline
+# A stage regresses when it is slower than the baseline by more than the threshold factor and by
+# more than the noise floor in absolute terms
+def compare(current, baseline, threshold=1.25, noise_floor=0.001):
+    previous = {(record['dataset'], record['stage']): record for record in baseline['results']}
+    regressions = []
+    print(f"{'dataset':<20} {'stage':<40} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for record in current['results']:
+        before = previous.get((record['dataset'], record['stage']))
+        if before is None:
+            continue
+        ratio = record['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        regressed = ratio > threshold and record['seconds'] - before['seconds'] > noise_floor
+        if regressed:
+            regressions.append(record)
+        print(f"{record['dataset']:<20} {record['stage']:<40} {before['seconds']:>9.4f}s {record['seconds']:>9.4f}s "
+              f"{ratio:>6.2f}x{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the load, clean, filter, aggregate and chart stages.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES, help='synthetic dataset sizes in rows')
+    parser.add_argument('--output', default=RESULTS_PATH, help='where to write the results (JSON)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown factor reported as a regression')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory pass')
+    args = parser.parse_args()
+
+    current = run(args.sizes, memory=not args.no_memory)
+    with open(args.output, 'w') as file:
+        json.dump(current, file, indent=2)
+    print(f'Wrote {args.output}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(current, file, indent=2)
+        print(f'Stored baseline {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare(current, json.load(file), args.threshold)
+        sys.exit(1 if regressions else 0)
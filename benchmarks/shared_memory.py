@@ -0,0 +1,70 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from cleandata import DATA_PATH, load_data
+from synthetic import write_raw
+
+
+# Resident memory of this process in MB: private (heap) pages and pages mapped from files, which
+# processes mapping the same file share through the page cache. Linux only (/proc).
+def resident_memory():
+    memory = {}
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                name, value = line.split(':')
+                memory[name] = int(value.split()[0]) / 1024
+    return memory
+
+# A dashboard process: load the dataset, read every column as a full scan would, report the memory
+# the dataset added and stay alive until every other process has reported too
+def session(path, barrier, results):
+    before = resident_memory()
+    df = load_data(path)
+    for column, values in df.items():
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values.cat.codes.max()
+        elif pd.api.types.is_numeric_dtype(values):
+            values.sum()
+        else:
+            values.str.len().max()
+    after = resident_memory()
+    results.put({name: after[name] - before[name] for name in after})
+    barrier.wait()
+
+def run(path, processes):
+    context = multiprocessing.get_context('spawn')
+    barrier, results = context.Barrier(processes), context.Queue()
+    workers = [context.Process(target=session, args=(path, barrier, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    memory = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return memory
+
+
+# Load the dataset in 1, 2, 4, ... concurrent processes; the private memory per process stays flat
+# because the cleaned columns are views of the memory-mapped columnar cache
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the memory of concurrent dashboard processes.')
+    parser.add_argument('--rows', type=int, help='use a synthetic dataset of this many rows instead of the bundled file')
+    parser.add_argument('--processes', type=int, nargs='*', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_raw(args.rows, os.path.join(directory, 'synthetic.csv')) if args.rows else DATA_PATH
+        load_data(path)  # clean once and write the columnar cache the processes map
+        print(f"{'processes':>9} {'private MB/process':>19} {'file-backed MB/process':>23}")
+        for processes in args.processes:
+            memory = run(path, processes)
+            private = sum(m['RssAnon'] for m in memory) / processes
+            mapped = sum(m['RssFile'] for m in memory) / processes
+            print(f'{processes:>9} {private:>19.1f} {mapped:>23.1f}')
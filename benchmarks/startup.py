@@ -0,0 +1,54 @@
+import argparse
+import ast
+import collections
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts a pod starts with
+ENTRY_POINTS = ['app.py', 'Question_1.py', 'Question_2.py', 'Question_3.py', 'api.py']
+
+
+# The module-level imports of a script, i.e. what runs before its first line of work
+def startup_imports(script):
+    with open(os.path.join(PROJECT_DIR, script)) as file:
+        tree = ast.parse(file.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+# Import time of every module loaded by the statements, in microseconds, measured by `python -X
+# importtime` in a fresh interpreter (so nothing is imported yet) with the project on the path
+def import_times(statements):
+    code = '\n'.join(statements)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=PROJECT_DIR,
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(own), int(cumulative)))
+    return times
+
+# Own import time summed per top-level package, largest first
+def breakdown(times):
+    packages = collections.Counter()
+    for name, own, _ in times:
+        packages[name.split('.')[0]] += own
+    return packages.most_common()
+
+
+# Print the total import time of each entry point and the packages it is spent in
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the import time of the entry points.')
+    parser.add_argument('scripts', nargs='*', default=ENTRY_POINTS)
+    parser.add_argument('--top', type=int, default=8, help='packages listed per entry point')
+    args = parser.parse_args()
+
+    for script in args.scripts:
+        times = import_times(startup_imports(script))
+        total = sum(own for _, own, _ in times)
+        print(f'{script}: {total / 1000:.0f} ms importing {len(times)} modules')
+        for package, own in breakdown(times)[:args.top]:
+            print(f'    {package:<24} {own / 1000:>7.1f} ms')
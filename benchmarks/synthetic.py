@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from cleandata import DATA_PATH, read_data
+
+
+# A raw export with the schema of data/Global_YouTube_Statistics.csv and `rows` rows. Rows are drawn
+# from the bundled file, so the value mix (countries, categories, blanks, zero views, odd characters)
+# stays realistic, while every channel gets a distinct name and noisy subscriber and view counts.
+def make_raw(rows, seed=0, path=DATA_PATH):
+    rng = np.random.default_rng(seed)
+    source = read_data(path)
+    raw = source.iloc[rng.integers(0, len(source), rows)].reset_index(drop=True)
+    suffix = pd.Series(np.arange(rows)).astype(str).radd(' ')
+    raw['Youtuber'] = raw['Youtuber'] + suffix
+    raw['Title'] = raw['Title'] + suffix
+    raw['rank'] = np.arange(1, rows + 1)
+    raw['subscribers'] = (raw['subscribers'] * rng.lognormal(0, 0.3, rows)).round().astype('int64')
+    raw['video views'] = (raw['video views'] * rng.lognormal(0, 0.3, rows)).round()
+    return raw
+
+# Write a synthetic export to a CSV file the way the real one is encoded
+def write_raw(rows, path, seed=0):
+    make_raw(rows, seed).to_csv(path, index=False, encoding='latin-1')
+    return path
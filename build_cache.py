@@ -0,0 +1,23 @@
+import sys
+
+from cleandata import CLEANING_STEPS, DATA_PATH, cache_path_for, compact_dtypes, footprint_report, read_cache, read_data, write_cache
+from search import open_search_index, search_path_for
+
+
+# Build the columnar cache of the cleaned dataset that the apps load on startup, and its search index
+# Usage: python build_cache.py [path/to/Global_YouTube_Statistics.csv]
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    df = read_data(path)
+    for step in CLEANING_STEPS:
+        if step is compact_dtypes:
+            uncompacted = df
+        df = step(df)
+    cache_path = write_cache(df, cache_path_for(path))
+    print(f'Wrote {cache_path}')
+    # The channel search index is stored with the cache it was built from
+    open_search_index(read_cache(cache_path), path)
+    print(f'Wrote {search_path_for(path)}')
+
+    # Report what the compact dtypes save per copy of the cleaned frame
+    print(footprint_report(uncompacted, df).to_string())
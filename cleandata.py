@@ -1,60 +1,320 @@
-import streamlit as st
+import collections
+import contextvars
+import functools
+import os
+import tempfile
+import threading
+import weakref
+
 import pandas as pd
-import plotly.express as px
-import matplotlib.pyplot as plt
-import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # the columnar cache is optional, the CSV path always works
+    pa = feather = None
+
+from textclean import normalize_series
+
+
+# Location of the raw dataset, resolved next to this file so the scripts work from any directory
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'Global_YouTube_Statistics.csv')
+
+# Characters kept in 'Youtuber' and 'Title'; everything else is removed (see textclean.py)
+pattern = r'[^a-zA-Z0-9\s.,!?&\'-]'
+
+# Float columns that only ever hold whole numbers
+float_to_int_columns = [
+    'Video Views', 'Video Views Rank', 'Country Rank', 'Channel Type Rank',
+    'Video Views For The Last 30 Days', 'Subscribers For Last 30 Days',
+    'Created Year', 'Population', 'Urban Population'
+]
+
+# Storage types of the cleaned frame: low-cardinality text as categoricals and free text as Arrow
+# strings. Numeric columns are downcast to the narrowest type that still holds every value exactly.
+category_columns = ['Category', 'Country', 'Abbreviation', 'Channel Type', 'Created Month']
+string_columns = ['Youtuber', 'Title']
+
 
 ##Open the data##
 # Import csv dataset & convert to pandas dataframe (df)
-df = pd.read_csv('data/Global_YouTube_Statistics.csv', encoding='latin-1')
-# Set the display.max_columns option to None to display all columns of the df
-pd.set_option('display.max_columns', None)
+def read_data(path=DATA_PATH):
+    return pd.read_csv(path, encoding='latin-1')
 
 
 ## Clean the data
+# Each step takes the frame produced by the previous one and may modify it in place
+
 # Rename columns: replace '_' with ' ' and capitalize each word
-df.columns = df.columns.str.replace('_', ' ').str.title()
+def rename_columns(df):
+    df.columns = df.columns.str.replace('_', ' ').str.title()
+    return df
 
 # Drop the 'Rank' column as it's not required
-df = df.drop(columns='Rank')
+def drop_rank(df):
+    return df.drop(columns='Rank')
 
 # Remove duplicate rows
-df = df.drop_duplicates()
+def drop_duplicate_rows(df):
+    return df.drop_duplicates()
 
 # Handle missing values
-# Replace missing values in categorical columns with 'Unknown'
-categorical_columns = df.select_dtypes(include=['object']).columns
-df[categorical_columns] = df[categorical_columns].fillna('Unknown')
+# Replace missing values in categorical columns with 'Unknown' and in numerical columns with 0
+def fill_missing_values(df):
+    categorical_columns = df.select_dtypes(include=['object']).columns
+    df[categorical_columns] = df[categorical_columns].fillna('Unknown')
+    numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns
+    df[numerical_columns] = df[numerical_columns].fillna(0)
+    return df
 
-# Replace missing values in numerical columns with 0
-numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns
-df[numerical_columns] = df[numerical_columns].fillna(0)
-
-# Remove and replace unwanted characters in 'Youtuber' and 'Title'
-import re
-pattern = r'[^a-zA-Z0-9\s.,!?&\'-]'
-df['Youtuber'] = df['Youtuber'].str.replace(pattern, '', regex=True)
-df['Title'] = df['Title'].str.replace(pattern, '', regex=True)
-
-# Trim leading/trailing whitespace
-df['Youtuber'] = df['Youtuber'].str.strip()
-df['Title'] = df['Title'].str.strip()
+# Remove unwanted characters in 'Youtuber' and 'Title' and trim leading/trailing whitespace
+# (textclean.py does both in one vectorized pass, with the same result as the regex). A text memo
+# from a previous load of the same source lets unchanged values skip the cleanup.
+def clean_text_columns(df, text_memo=None):
+    df['Youtuber'] = normalize_series(df['Youtuber'], text_memo)
+    df['Title'] = normalize_series(df['Title'], text_memo)
+    return df
 
 # Remove rows with 0 video views, blank Youtuber names, and 'Created Year' as 0
-df = df[df['Video Views'] != 0]
-df = df[df['Youtuber'] != '']
-df = df[df['Created Year'] != 0]
+def remove_invalid_rows(df):
+    return df[(df['Video Views'] != 0) & (df['Youtuber'] != '') & (df['Created Year'] != 0)]
 
 # Convert certain float columns to integers
-float_to_int_columns = [
-    'Video Views', 'Video Views Rank', 'Country Rank', 'Channel Type Rank',
-    'Video Views For The Last 30 Days', 'Subscribers For Last 30 Days',
-    'Created Year', 'Population', 'Urban Population'
-]
-df[float_to_int_columns] = df[float_to_int_columns].astype(int)
+def convert_float_columns(df):
+    df = df.copy()
+    df[float_to_int_columns] = df[float_to_int_columns].astype(int)
+    return df
 
 # Sort by 'Subscribers' and reset index
-df = df.sort_values(by='Subscribers', ascending=False)
-df = df.reset_index(drop=True)
+def sort_by_subscribers(df):
+    df = df.sort_values(by='Subscribers', ascending=False)
+    return df.reset_index(drop=True)
+
+# Store the cleaned columns in compact dtypes
+def compact_dtypes(df):
+    plan = {column: 'category' for column in category_columns}
+    if feather is not None:
+        plan.update({column: 'string[pyarrow]' for column in string_columns})
+    df = df.astype(plan)
+    for column in df.select_dtypes(include='integer').columns:
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    for column in df.select_dtypes(include='float').columns:
+        narrow = df[column].astype('float32')
+        if (narrow == df[column]).all():
+            df[column] = narrow
+    return df
+
+# Memory footprint of every column before and after compaction, in bytes
+def footprint_report(before, after):
+    report = pd.DataFrame({
+        'Before dtype': before.dtypes.astype(str),
+        'After dtype': after.dtypes.astype(str),
+        'Before bytes': before.memory_usage(index=False, deep=True),
+        'After bytes': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['Total'] = ['', '', report['Before bytes'].sum(), report['After bytes'].sum()]
+    return report
+
+
+CLEANING_STEPS = [
+    rename_columns,
+    drop_rank,
+    drop_duplicate_rows,
+    fill_missing_values,
+    clean_text_columns,
+    remove_invalid_rows,
+    convert_float_columns,
+    sort_by_subscribers,
+    compact_dtypes,
+]
+
+
+# Run every cleaning step over a raw frame
+def clean_data(df, text_memo=None):
+    for step in CLEANING_STEPS:
+        df = step(df, text_memo) if step is clean_text_columns else step(df)
+    return df
+
+
+## Columnar cache on disk
+# The cleaned frame is written next to the CSV as uncompressed Feather (Arrow IPC), which keeps
+# the dtypes and can be memory-mapped, so a cold start skips CSV decoding and cleaning entirely.
+def cache_path_for(path):
+    return os.path.splitext(path)[0] + '.feather'
+
+# The cache is only used when it was written after the CSV was last modified
+def cache_is_fresh(path, cache_path=None):
+    cache_path = cache_path or cache_path_for(path)
+    if feather is None or not os.path.exists(cache_path):
+        return False
+    return os.stat(cache_path).st_mtime_ns >= os.stat(path).st_mtime_ns
+
+# The frame is a zero-copy view of the memory-mapped file: every column keeps its own block
+# (split_blocks) and is backed by the file's pages instead of being copied to the heap, so every
+# process on the host shares one copy of the data through the page cache. The arrays are read-only.
+# Arrow string columns stay Arrow-backed instead of becoming Python objects.
+def read_cache(cache_path):
+    table = feather.read_table(cache_path, memory_map=True)
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow'), pa.large_string(): pd.StringDtype('pyarrow')}.get,
+                           split_blocks=True)
+
+# Write to a temporary file first so readers never see a half-written cache. The temporary file is
+# unique to the writer, as several processes starting on a stale cache may rebuild it at once; the
+# last one to finish replaces the others' complete files. The rows are written as one record batch:
+# a column split over several batches is concatenated (copied) on read.
+def write_cache(df, cache_path):
+    if feather is None:
+        raise ImportError('pyarrow is required to write the columnar cache')
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)),
+                                    prefix=os.path.basename(cache_path) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        feather.write_feather(df, tmp_path, compression='uncompressed', chunksize=max(len(df), 1))
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return cache_path
+
+# Load from the columnar cache when it is fresh, otherwise clean the CSV and rebuild the cache
+def _load_cleaned(path, text_memo=None):
+    cache_path = cache_path_for(path)
+    if cache_is_fresh(path, cache_path):
+        return read_cache(cache_path)
+    df = clean_data(read_data(path), text_memo)
+    if feather is not None:
+        try:
+            # Serve the mapped file rather than the frame just cleaned, so this process shares it too
+            return read_cache(write_cache(df, cache_path))
+        except OSError:
+            pass  # read-only data directory, keep serving from the CSV
+    return df
+
+
+## Cache the cleaned data
+# The cleaned frame is kept once per process, keyed on the source file's path, size and mtime and
+# on the columnar cache's mtime, so Streamlit reruns reuse it instead of parsing and cleaning the
+# CSV again, and pick up an updated columnar cache written by another process.
+# The returned frame is shared between callers and must be treated as read-only.
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Text memo of each source file cleaned from the CSV (see textclean.py), so the next export of the
+# same file only cleans the names that changed; dropped with the file's cached frame
+_text_memos = {}
+
+# Hits and misses of the in-memory caches go to the collector of the current context, when there is
+# one. diagnostics.py sets a collector for each instrumented rerun; the context is per thread (every
+# Streamlit session runs its script in its own thread), so a rerun only counts its own events.
+_cache_events = contextvars.ContextVar('cache_events', default=None)
+
+
+def record_cache_event(name, hit):
+    events = _cache_events.get()
+    if events is not None:
+        events[name + (' hit' if hit else ' miss')] += 1
+
+# Start counting the cache events of the current context; returns the counter and the token that
+# stop_collecting_cache_events takes
+def collect_cache_events():
+    events = collections.Counter()
+    return events, _cache_events.set(events)
+
+def stop_collecting_cache_events(token):
+    _cache_events.reset(token)
+
+
+def _source_key(path):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cache_path = cache_path_for(path)
+    cache_mtime = os.stat(cache_path).st_mtime_ns if os.path.exists(cache_path) else None
+    return path, stat.st_size, stat.st_mtime_ns, cache_mtime
+
+
+def _remember(key, df):
+    # Forget older versions of the same file
+    for stale in [k for k in _cache if k[0] == key[0]]:
+        del _cache[stale]
+    _cache[key] = df
+
+
+# Load the cleaned dataset, re-running the pipeline only when the source file changed
+def load_data(path=DATA_PATH):
+    key = _source_key(path)
+    with _cache_lock:
+        df = _cache.get(key)
+        record_cache_event('load_data', df is not None)
+        if df is None:
+            df = _load_cleaned(path, _text_memos.setdefault(key[0], {}))
+            # Loading from the CSV may have just rewritten the columnar cache
+            _remember(_source_key(path), df)
+    return df
+
+
+# Replace the cleaned data of a source file with an updated frame (see delta.py) and persist it to
+# the columnar cache, so later loads in every process start from it until the CSV itself changes
+def replace_data(df, path=DATA_PATH):
+    with _cache_lock:
+        if feather is not None:
+            try:
+                write_cache(df, cache_path_for(path))
+            except OSError:
+                pass  # read-only data directory, the update stays in this process
+        _remember(_source_key(path), df)
+
+
+# Drop the cached frame for one source file, or for every file when no path is given
+def clear_cache(path=None):
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+            _text_memos.clear()
+        else:
+            path = os.path.abspath(path)
+            for key in [k for k in _cache if k[0] == path]:
+                del _cache[key]
+            _text_memos.pop(path, None)
+
+
+# Memoize a structure derived from a cleaned frame (indexes, aggregates, ...) so it is built once
+# per frame and dropped together with it. The built value must not hold a reference to the frame,
+# otherwise the frame is never released.
+def cached_per_frame(build):
+    results = {}
+    lock = threading.Lock()
+
+    @functools.wraps(build)
+    def get(df):
+        key = id(df)
+        with lock:
+            record_cache_event(build.__qualname__, key in results)
+            if key not in results:
+                results[key] = build(df)
+                weakref.finalize(df, results.pop, key, None)
+            return results[key]
+
+    # Store a value built elsewhere for a frame, e.g. updated incrementally from an older frame's
+    def prime(df, value):
+        key = id(df)
+        with lock:
+            if key not in results:
+                weakref.finalize(df, results.pop, key, None)
+            results[key] = value
+
+    # The value built for a frame, or None when nothing was built for it (nothing is built)
+    def peek(df):
+        with lock:
+            return results.get(id(df))
+
+    get.prime = prime
+    get.peek = peek
+    return get
+
+
+if __name__ == '__main__':
+    import streamlit as st
 
-st.dataframe(df)
\ No newline at end of file
+    # Set the display.max_columns option to None to display all columns of the df
+    pd.set_option('display.max_columns', None)
+    st.dataframe(load_data())
@@ -0,0 +1,56 @@
+from cleandata import cached_per_frame
+
+
+# Dimensions and measures of the pre-aggregated cube
+CUBE_KEYS = ['Country', 'Category', 'Created Year']
+CUBE_MEASURES = ['Subscribers', 'Video Views']
+
+
+## Data cube for the category and country charts
+# Sum of Subscribers and Video Views plus the number of channels for every
+# (Country, Category, Created Year) cell, computed once per cleaned frame. Any filter on those
+# columns is answered by rolling up the matching cells (a few hundred) instead of the channel rows.
+def build_cube(df):
+    grouped = df.groupby(CUBE_KEYS, observed=True)
+    cube = grouped[CUBE_MEASURES].sum().astype('int64')
+    cube['Channels'] = grouped.size()
+    return cube.reset_index()
+
+
+get_cube = cached_per_frame(build_cube)
+
+
+# Roll the cube up to the `by` columns over the cells matching the selections (column -> accepted
+# values, empty selections don't filter). Adds the average of every measure per channel.
+def rollup(cube, by, selections=None):
+    cells = cube
+    for column, values in (selections or {}).items():
+        if values is not None and len(values):
+            cells = cells[cells[column].isin(values)]
+    totals = cells.groupby(by, observed=True)[CUBE_MEASURES + ['Channels']].sum()
+    return add_averages(totals).reset_index()
+
+def add_averages(totals):
+    for measure in CUBE_MEASURES:
+        totals[f'Average {measure}'] = totals[measure] / totals['Channels']
+    return totals
+
+
+# Label of the bucket holding the values collapsed by collapse_rest
+OTHER = 'Other'
+
+
+# Keep the `keep` values of a rolled-up column with the largest total `measure` and merge the rest
+# into one OTHER row per combination of the remaining columns, so a chart draws a bounded number of
+# marks. Sums and channel counts are added up and the averages recomputed from them; rows come out
+# ordered by the column's totals, largest first, with OTHER last.
+def collapse_rest(totals, column, keep, measure='Subscribers'):
+    ranking = totals.groupby(column, observed=True)[measure].sum().sort_values(ascending=False)
+    if len(ranking) <= keep:
+        return totals
+    order = {value: position for position, value in enumerate(ranking.index[:keep])}
+    order[OTHER] = keep
+    labels = totals[column].astype(object).where(totals[column].isin(ranking.index[:keep]), OTHER)
+    by = [labels.rename(column) if key == column else key for key in totals.columns if key in CUBE_KEYS]
+    collapsed = add_averages(totals.groupby(by, observed=True, sort=False)[CUBE_MEASURES + ['Channels']].sum()).reset_index()
+    return collapsed.sort_values(column, key=lambda values: values.map(order), kind='stable').reset_index(drop=True)
@@ -0,0 +1,135 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cleandata import (CLEANING_STEPS, DATA_PATH, compact_dtypes, load_data, read_data, replace_data,
+                       sort_by_subscribers)
+from cube import CUBE_KEYS, CUBE_MEASURES, build_cube, get_cube
+from filters import FilterIndex, get_filter_index
+from topk import TopK, get_topk
+
+
+## Cleaning a batch of new rows
+# The batch goes through the same rules as the full file; a channel listed twice keeps its last row
+def clean_batch(batch):
+    for step in CLEANING_STEPS:
+        if step not in (sort_by_subscribers, compact_dtypes):
+            batch = step(batch)
+    batch = batch.drop_duplicates(subset='Youtuber', keep='last')
+    return sort_by_subscribers(batch)
+
+# Give the batch the frame's dtypes. Categoricals get the union of both sides' categories (new
+# categories are appended, so existing codes stay valid) and numeric columns widen when needed.
+def align_dtypes(df, batch):
+    compact_batch = compact_dtypes(batch)
+    df_dtypes, batch_dtypes = {}, {}
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = dtype.categories.union(pd.Index(batch[column].unique()), sort=False)
+            if len(categories) > len(dtype.categories):
+                dtype = df_dtypes[column] = pd.CategoricalDtype(categories)
+        elif isinstance(dtype, np.dtype):
+            widened = np.result_type(dtype, compact_batch[column].dtype)
+            if widened != dtype:
+                dtype = df_dtypes[column] = widened
+        batch_dtypes[column] = dtype
+    return df.astype(df_dtypes), batch.astype(batch_dtypes)
+
+
+## Updating the structures built from the old frame
+# Filter index: the old rows keep their codes at their new positions, the batch rows are coded
+# with the existing values (new values are appended), and the value groups are rebuilt with a
+# linear-time radix pass over the small integer codes instead of factorizing every row again
+def update_filter_index(index, merged, old_to_new, batch_rows, batch):
+    updated = FilterIndex(len(merged))
+    kept = old_to_new >= 0
+    for column, old_codes in index.codes.items():
+        uniques = list(index.uniques[column])
+        positions = dict(index.positions[column])
+        batch_codes = []
+        for value in batch[column]:
+            if value not in positions:
+                positions[value] = len(uniques)
+                uniques.append(value)
+            batch_codes.append(positions[value])
+        codes = np.empty(len(merged), dtype=np.int64)
+        codes[old_to_new[kept]] = old_codes[kept]
+        codes[batch_rows] = batch_codes
+        updated.add_column(column, codes, uniques)
+    return updated
+
+# Top-K orderings: the old order minus the replaced rows is still sorted, so the (sorted) batch
+# rows are merged into it by binary search instead of sorting every row again
+def update_topk(top, filter_index, merged, old_to_new, batch_rows):
+    orders = {}
+    for metric, order in top.orders.items():
+        values = merged[metric].to_numpy()
+        kept_order = old_to_new[order]
+        kept_order = kept_order[kept_order >= 0]
+        added = batch_rows[np.argsort(-values[batch_rows], kind='stable')]
+        positions = np.searchsorted(-values[kept_order], -values[added], side='right')
+        orders[metric] = np.insert(kept_order, positions, added)
+    return TopK(filter_index, orders, top.columns)
+
+# Cube: subtract the cells of the replaced rows and add the cells of the batch
+def update_cube(cube, removed, added, key_dtypes):
+    removed_cells = build_cube(removed)
+    removed_cells[CUBE_MEASURES + ['Channels']] *= -1
+    parts = [part.astype(key_dtypes) for part in (cube, removed_cells, build_cube(added))]
+    cube = pd.concat(parts, ignore_index=True).groupby(CUBE_KEYS, observed=True, as_index=False)[CUBE_MEASURES + ['Channels']].sum()
+    return cube[cube['Channels'] > 0].reset_index(drop=True)
+
+
+## Applying a batch
+# Upsert a batch of raw channel rows (same columns as the CSV export) into a cleaned frame. Rows of
+# channels already present are replaced, matched by Youtuber. Only the batch is cleaned; it is merged
+# into the Subscribers ordering by binary search. The filter index, top-K orderings and cube already
+# built for the old frame (in a process serving it, see api.py's /update) are updated and registered
+# for the returned frame instead of being rebuilt; structures that weren't built are left to be
+# built when first used.
+def apply_delta(df, batch):
+    index, top, cube = get_filter_index.peek(df), get_topk.peek(df), get_cube.peek(df)
+    batch = clean_batch(batch)
+    replaced = df['Youtuber'].isin(batch['Youtuber']).to_numpy()
+    aligned, batch = align_dtypes(df, batch)
+
+    # Where each batch row goes among the kept rows, largest Subscribers first
+    kept_rows = np.flatnonzero(~replaced)
+    kept_subscribers = aligned['Subscribers'].to_numpy()[kept_rows]
+    positions = np.searchsorted(-kept_subscribers, -batch['Subscribers'].to_numpy(), side='right')
+    source = np.insert(kept_rows, positions, len(df) + np.arange(len(batch)))
+    merged = pd.concat([aligned, batch], ignore_index=True).take(source).reset_index(drop=True)
+
+    # Position in the merged frame of every old row (-1 when replaced) and of every batch row
+    new_position = np.full(len(df) + len(batch), -1)
+    new_position[source] = np.arange(len(source))
+    old_to_new, batch_rows = new_position[:len(df)], new_position[len(df):]
+
+    if index is not None:
+        merged_index = update_filter_index(index, merged, old_to_new, batch_rows, batch)
+        get_filter_index.prime(merged, merged_index)
+        if top is not None:
+            get_topk.prime(merged, update_topk(top, merged_index, merged, old_to_new, batch_rows))
+    if cube is not None:
+        key_dtypes = {key: merged[key].dtype for key in CUBE_KEYS}
+        get_cube.prime(merged, update_cube(cube, aligned[replaced], batch, key_dtypes))
+    return merged
+
+# Apply a batch to the dataset served by load_data and persist the result. Other processes pick up
+# the rewritten columnar cache on their next load and rebuild their structures from it.
+def apply_update(batch, path=DATA_PATH):
+    df = apply_delta(load_data(path), batch)
+    replace_data(df, path)
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Upsert a batch of channel rows into the cleaned dataset.')
+    parser.add_argument('batch', help='CSV file with new or updated channel rows, in the export format')
+    parser.add_argument('--data', default=DATA_PATH, help='dataset the batch is applied to')
+    args = parser.parse_args()
+
+    before = len(load_data(args.data))
+    after = len(apply_update(read_data(args.batch), args.data))
+    print(f'Dataset now holds {after} channels ({after - before:+d})')
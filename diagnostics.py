@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from cleandata import collect_cache_events, stop_collecting_cache_events
+
+
+# Diagnostics are on for every session when this environment variable is set to 1; otherwise
+# each session can switch them on from the sidebar
+ENV_VAR = 'YT_DIAGNOSTICS'
+
+# One JSON line per instrumented rerun, for log collectors to scrape
+logger = logging.getLogger('dashboard.diagnostics')
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+# Start profiling and return a function that stops it and returns the report as text. The
+# profilers are imported here, so a rerun that isn't profiled doesn't load them.
+def start_profiler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:  # fall back to the standard library's deterministic profiler
+        import cProfile
+        import io
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def stop():
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(30)
+            return output.getvalue()
+        return stop
+
+    profiler = Profiler()
+    profiler.start()
+
+    def stop():
+        profiler.stop()
+        return profiler.output_text()
+    return stop
+
+
+## Instrumentation of one Streamlit rerun
+# Times the phases of the rerun, counts the cache hits and misses it caused and the size of the
+# figures it sent. When profiling is requested the whole rerun runs under a profiler. Everything
+# is a no-op unless diagnostics are enabled, so the default rerun pays nothing for it.
+class Rerun:
+    def __init__(self, enabled, profile=False):
+        self.enabled = enabled
+        self.question = None
+        self.phases = []
+        self.figures = []
+        self.started = time.perf_counter()
+        self.cache_events, self.cache_token = collect_cache_events() if enabled else (None, None)
+        self.stop_profiler = start_profiler() if enabled and profile else None
+
+    # Start instrumenting a rerun with the switches the session chose on its previous run
+    @classmethod
+    def start(cls, session_state):
+        enabled = os.environ.get(ENV_VAR) == '1' or session_state.get('diagnostics', False)
+        return cls(enabled, profile=session_state.get('profile_rerun', False))
+
+    # Sidebar switches; their values apply from the next rerun on
+    def sidebar_controls(self):
+        with st.sidebar.expander('Diagnostics'):
+            st.toggle('Show diagnostics', key='diagnostics', value=os.environ.get(ENV_VAR) == '1')
+            st.checkbox('Profile reruns', key='profile_rerun')
+
+    # Time a phase; details such as the rows it scanned can be added to the yielded dict
+    @contextmanager
+    def phase(self, name, **details):
+        if not self.enabled:
+            yield details
+            return
+        start = time.perf_counter()
+        try:
+            yield details
+        finally:
+            self.phases.append({'question': self.question, 'phase': name,
+                                'seconds': time.perf_counter() - start, **details})
+
+    # Send a figure to the browser, timing the serialization and recording its payload size
+    def chart(self, name, figure, **kwargs):
+        if not self.enabled:
+            return st.plotly_chart(figure, **kwargs)
+        with self.phase(f'render {name}') as details:
+            details['payload_bytes'] = len(figure.to_json())
+            self.figures.append({'figure': name, 'payload_bytes': details['payload_bytes']})
+            return st.plotly_chart(figure, **kwargs)
+
+    def report(self):
+        cache_events = self.cache_events
+        return {
+            'event': 'rerun',
+            'question': self.question,
+            'total_seconds': time.perf_counter() - self.started,
+            'phases': self.phases,
+            'figures': self.figures,
+            'cache': {
+                'hits': sum(count for name, count in cache_events.items() if name.endswith(' hit')),
+                'misses': sum(count for name, count in cache_events.items() if name.endswith(' miss')),
+                'events': dict(cache_events),
+            },
+        }
+
+    # Log the rerun and show the collapsible diagnostics panel
+    def finish(self):
+        if not self.enabled:
+            return
+        profile = self.stop_profiler() if self.stop_profiler is not None else None
+        stop_collecting_cache_events(self.cache_token)
+        report = self.report()
+        logger.info(json.dumps(report, default=str))
+        with st.expander('Rerun diagnostics'):
+            st.write(f"Rerun took **{report['total_seconds'] * 1000:.1f} ms**; "
+                     f"cache hits: {report['cache']['hits']}, misses: {report['cache']['misses']}")
+            st.dataframe(pd.DataFrame(report['phases']))
+            if report['cache']['events']:
+                st.json(report['cache']['events'])
+            if profile:
+                st.code(profile)
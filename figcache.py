@@ -0,0 +1,93 @@
+import collections
+import threading
+
+import numpy as np
+
+from cleandata import cached_per_frame, record_cache_event
+
+
+# Serialized size of the figures kept per dataset version
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+# Bytes allowed for a figure's layout and template, which don't grow with the data
+LAYOUT_BYTES = 8 * 1024
+
+# Bytes of a number in the figure's JSON
+NUMBER_BYTES = 16
+
+
+# Approximate JSON size of a trace property: numeric arrays by their length, text by its length
+def json_size(value):
+    if isinstance(value, dict):
+        return sum(len(key) + 4 + json_size(item) for key, item in value.items())
+    if isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+        return value.size * NUMBER_BYTES
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return sum(json_size(item) + 1 for item in value) + 2
+    if isinstance(value, str):
+        return len(value) + 2
+    return NUMBER_BYTES
+
+# Approximate size of the JSON Streamlit sends for a figure, estimated from its traces instead of
+# serializing it: st.plotly_chart serializes every figure it draws, and measuring a cache entry the
+# same way would double the cost of every miss
+def figure_size(figure):
+    return LAYOUT_BYTES + sum(json_size(trace.to_plotly_json()) for trace in figure.data)
+
+
+# Key of a filter selection: the selected values of each column, in a fixed order. A column with
+# nothing selected means "all values", so it is left out and every way of selecting nothing
+# (the most common request) shares one entry.
+def selection_key(selections):
+    return tuple(sorted((column, tuple(sorted(values))) for column, values in selections.items() if values))
+
+
+## Built figures shared by every session
+# Plotly figures keyed by (question, chart, selection), least recently used first. The size of an
+# entry is the estimated length of its JSON, the payload Streamlit sends to the browser; entries are
+# evicted until the total fits max_bytes. Cached figures are shared, so they must be finished (layout
+# updated) before they are stored and never changed afterwards. Other values can be cached with
+# another size function, e.g. len for serialized responses.
+class FigureCache:
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES, size=figure_size, name='figure'):
+        self.max_bytes = max_bytes
+        self.size = size
+        self.name = name
+        self.total_bytes = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    # The cached figure for key, or build() stored under it. Two sessions missing the same key at
+    # once both build it; the build runs outside the lock so other keys are not held up.
+    def get(self, key, build):
+        with self.lock:
+            entry = self.entries.get(key)
+            record_cache_event(self.name, entry is not None)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry[0]
+        figure = build()
+        size = self.size(figure)
+        with self.lock:
+            if key not in self.entries and size <= self.max_bytes:
+                self.entries[key] = figure, size
+                self.total_bytes += size
+                while self.total_bytes > self.max_bytes:
+                    _, (_, evicted) = self.entries.popitem(last=False)
+                    self.total_bytes -= evicted
+        return figure
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+# One figure cache per cleaned frame: a new dataset version (a reload of a changed file, an applied
+# delta) is a new frame and starts empty, and the old figures are dropped with the old frame
+def new_figure_cache(df):
+    return FigureCache()
+
+
+get_figure_cache = cached_per_frame(new_figure_cache)
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from cleandata import cached_per_frame
+
+
+# Columns the dashboard filters on
+FILTER_COLUMNS = ['Country', 'Category', 'Created Year', 'Channel Type']
+
+
+# Narrowest signed integer type holding codes 0 .. n - 1
+def smallest_int(n):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+## Inverted index for the sidebar filters
+# For every filter column the rows are grouped by value once: row_ids holds the row ids of each
+# value next to each other (ascending, so the frame's Subscribers ordering is kept) and offsets
+# marks where each value starts. A multiselect is answered by concatenating the slices of the
+# selected values (OR) and checking the other columns' codes for the candidate rows only (AND),
+# so the cost follows the size of the result instead of the size of the frame.
+class FilterIndex:
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self.codes = {}
+        self.uniques = {}
+        self.positions = {}
+        self.offsets = {}
+        self.row_ids = {}
+
+    # Index the filter columns of a frame
+    @classmethod
+    def build(cls, df, columns=FILTER_COLUMNS):
+        index = cls(len(df))
+        for column in columns:
+            codes, uniques = pd.factorize(df[column])
+            index.add_column(column, codes, list(uniques))
+        return index
+
+    # Index a column given the code of every row, a code being the value's position in uniques
+    def add_column(self, column, codes, uniques):
+        # Codes of up to 16 bits are grouped with numpy's linear-time radix sort
+        codes = codes.astype(smallest_int(len(uniques)), copy=False)
+        counts = np.bincount(codes, minlength=len(uniques))
+        self.codes[column] = codes
+        self.uniques[column] = uniques
+        self.positions[column] = {value: code for code, value in enumerate(uniques)}
+        self.offsets[column] = np.concatenate([[0], np.cumsum(counts)])
+        self.row_ids[column] = np.argsort(codes, kind='stable')
+
+    # Distinct values of a column in order of first appearance, like df[column].unique()
+    def options(self, column):
+        return self.uniques[column]
+
+    # Codes of the given values, skipping values the column doesn't hold; a value given twice is
+    # selected once
+    def selected_codes(self, column, values):
+        positions = self.positions[column]
+        return list(dict.fromkeys(positions[value] for value in values if value in positions))
+
+    # Row ids holding any of the given values, ascending
+    def rows_for(self, column, values):
+        offsets, row_ids = self.offsets[column], self.row_ids[column]
+        parts = [row_ids[offsets[code]:offsets[code + 1]] for code in self.selected_codes(column, values)]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    # Number of rows holding any of the given values
+    def count(self, column, values):
+        offsets = self.offsets[column]
+        return sum(offsets[code + 1] - offsets[code] for code in self.selected_codes(column, values))
+
+    # Boolean lookup table over a column's codes marking the selected values
+    def code_mask(self, column, values):
+        mask = np.zeros(len(self.uniques[column]), dtype=bool)
+        mask[self.selected_codes(column, values)] = True
+        return mask
+
+    # Row ids (ascending) matching every selection, where a selection maps a column to the
+    # accepted values; empty selections don't filter. Returns None when nothing is selected.
+    def select(self, selections):
+        active = {column: values for column, values in selections.items() if values is not None and len(values)}
+        if not active:
+            return None
+        # Start from the most selective column and only look up the others for those rows
+        start = min(active, key=lambda column: self.count(column, active[column]))
+        rows = self.rows_for(start, active.pop(start))
+        for column, values in active.items():
+            rows = rows[self.code_mask(column, values)[self.codes[column][rows]]]
+        return rows
+
+    # Number of rows matching the selections; with one selected column it is read off the offsets
+    # without listing the rows
+    def size(self, selections):
+        active = {column: values for column, values in selections.items() if values is not None and len(values)}
+        if not active:
+            return self.n_rows
+        if len(active) == 1:
+            column, values = active.popitem()
+            return int(self.count(column, values))
+        return len(self.select(active))
+
+
+get_filter_index = cached_per_frame(FilterIndex.build)
@@ -0,0 +1,133 @@
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from cleandata import DATA_PATH, load_data
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # the history store needs pyarrow; the dashboard itself doesn't
+    pa = pc = ds = pq = None
+
+
+HISTORY_PATH = os.path.join(os.path.dirname(DATA_PATH), 'history')
+
+# Columns kept per snapshot: the dimensions trends are grouped by, the totals and the 30-day gains
+HISTORY_COLUMNS = ['Youtuber', 'Category', 'Country', 'Channel Type', 'Subscribers', 'Video Views',
+                   'Subscribers For Last 30 Days', 'Video Views For The Last 30 Days']
+
+# The column holding the gain over the last 30 days of each metric
+LAST_30_DAYS = {
+    'Subscribers': 'Subscribers For Last 30 Days',
+    'Video Views': 'Video Views For The Last 30 Days',
+}
+
+
+## Append-only snapshot store
+# One Parquet partition per snapshot, in a directory named snapshot_date=YYYY-MM-DD (Hive style),
+# so a query over a date range only opens the partitions in the range, and reads only the columns
+# it needs. Text columns are dictionary-encoded and everything is zstd-compressed.
+def partitioning():
+    return ds.partitioning(pa.schema([('snapshot_date', pa.date32())]), flavor='hive')
+
+def partition_path(snapshot_date, root=HISTORY_PATH):
+    return os.path.join(root, f'snapshot_date={snapshot_date.isoformat()}')
+
+# Add a cleaned frame as the snapshot of a date. Snapshots are never rewritten: appending a date
+# that is already stored raises FileExistsError. The partition is written to a temporary directory
+# unique to the writer (its _ prefix hides it from dataset scans) and renamed into place, so readers
+# never see a partial snapshot and concurrent writers of one date can't mix their files.
+def append_snapshot(df, snapshot_date, root=HISTORY_PATH):
+    if pa is None:
+        raise ImportError('pyarrow is required for the history store')
+    path = partition_path(snapshot_date, root)
+    if os.path.exists(path):
+        raise FileExistsError(f'Snapshot {snapshot_date} is already stored in {root}')
+    table = pa.Table.from_pandas(df[HISTORY_COLUMNS], preserve_index=False)
+    # Categoricals are stored as text, so snapshots with different category sets read as one column
+    table = table.cast(pa.schema([pa.field(field.name, pa.string()) if pa.types.is_dictionary(field.type) else field
+                                  for field in table.schema]))
+    os.makedirs(root, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=root, prefix='_' + os.path.basename(path) + '.')
+    try:
+        pq.write_table(table, os.path.join(tmp_path, 'part-0.parquet'), compression='zstd')
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(path):
+                raise FileExistsError(f'Snapshot {snapshot_date} is already stored in {root}')
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+def history_dataset(root=HISTORY_PATH):
+    return ds.dataset(root, format='parquet', partitioning=partitioning())
+
+# Filter expression for a date range and column -> accepted values selections (empty don't filter)
+def history_filter(start=None, end=None, selections=None):
+    expression = ds.field('snapshot_date').is_valid()
+    if start is not None:
+        expression &= ds.field('snapshot_date') >= pa.scalar(start, pa.date32())
+    if end is not None:
+        expression &= ds.field('snapshot_date') <= pa.scalar(end, pa.date32())
+    for column, values in (selections or {}).items():
+        if values:
+            expression &= ds.field(column).isin([str(value) for value in values])
+    return expression
+
+
+## Trend queries
+# Total of a metric per snapshot and value of `by` (Category, Country, Channel Type or Youtuber),
+# with the change since the previous snapshot and the gain reported for the last 30 days. The
+# snapshots are scanned batch by batch and each batch is reduced to its group totals right away,
+# so memory is bounded by the number of groups, not by the size of the history.
+def growth(by='Category', metric='Subscribers', start=None, end=None, selections=None, root=HISTORY_PATH):
+    keys = ['snapshot_date', by]
+    measures = [metric, LAST_30_DAYS[metric]]
+    partials = []
+    scanner = history_dataset(root).scanner(columns=keys + measures, filter=history_filter(start, end, selections))
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            totals = pa.Table.from_batches([batch]).group_by(keys).aggregate([(measure, 'sum') for measure in measures])
+            partials.append(totals.to_pandas())
+    if not partials:
+        return pd.DataFrame(columns=keys + [metric, 'Change', 'Last 30 Days'])
+    totals = pd.concat(partials, ignore_index=True).groupby(keys, as_index=False)[[f'{measure}_sum' for measure in measures]].sum()
+    totals.columns = keys + [metric, 'Last 30 Days']
+    totals = totals.sort_values(keys, ignore_index=True)
+    totals['Change'] = totals.groupby(by)[metric].diff()
+    return totals[keys + [metric, 'Change', 'Last 30 Days']]
+
+# Every stored snapshot of one channel
+def channel_history(youtuber, start=None, end=None, root=HISTORY_PATH):
+    columns = ['snapshot_date'] + HISTORY_COLUMNS
+    table = history_dataset(root).to_table(columns=columns, filter=history_filter(start, end, {'Youtuber': [youtuber]}))
+    return table.to_pandas().sort_values('snapshot_date', ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep dated snapshots of the cleaned dataset and query growth trends.')
+    parser.add_argument('--history', default=HISTORY_PATH, help='directory of the snapshot store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    append = commands.add_parser('append', help='store the cleaned dataset as a snapshot')
+    append.add_argument('--data', default=DATA_PATH, help='CSV export to store')
+    append.add_argument('--date', type=datetime.date.fromisoformat, default=datetime.date.today(), help='snapshot date (YYYY-MM-DD)')
+    trend = commands.add_parser('growth', help='print the totals per snapshot')
+    trend.add_argument('--by', default='Category', choices=['Category', 'Country', 'Channel Type', 'Youtuber'])
+    trend.add_argument('--metric', default='Subscribers', choices=list(LAST_30_DAYS))
+    trend.add_argument('--start', type=datetime.date.fromisoformat)
+    trend.add_argument('--end', type=datetime.date.fromisoformat)
+    args = parser.parse_args()
+
+    if args.command == 'append':
+        print(f'Wrote {append_snapshot(load_data(args.data), args.date, args.history)}')
+    else:
+        print(growth(args.by, args.metric, args.start, args.end, root=args.history).to_string(index=False))
@@ -0,0 +1,186 @@
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cleandata import (DATA_PATH, clean_text_columns, compact_dtypes, convert_float_columns, drop_rank,
+                       fill_missing_values, remove_invalid_rows, rename_columns, sort_by_subscribers, write_cache)
+from cube import CUBE_KEYS, CUBE_MEASURES, build_cube
+from validation import Validator
+
+
+# Rows per batch; peak memory is a small multiple of one batch
+DEFAULT_CHUNKSIZE = 100_000
+
+# Raw text columns, read as strings so every batch gets the same dtypes whatever values it holds
+RAW_TEXT_COLUMNS = ['Youtuber', 'category', 'Title', 'Country', 'Abbreviation', 'channel_type', 'created_month']
+
+# The cleaning rules applied to each batch; duplicates are removed across batches separately and
+# the Subscribers ordering needs the whole dataset, so it is left to whoever loads the result
+CHUNK_CLEANING_STEPS = [
+    fill_missing_values,
+    clean_text_columns,
+    remove_invalid_rows,
+    convert_float_columns,
+]
+
+
+## Duplicate rows across batches
+# Rows are identified by a 64-bit hash of their raw values (8 bytes per distinct row, the only state
+# that grows with the file). The hashes seen so far are kept as sorted runs of geometrically
+# decreasing size, like the levels of an LSM tree: the new hashes of a batch become a run of their
+# own, merged into the run before it while that one is at most twice as large. There are about
+# log2(rows / batch) runs, and a hash takes part in as many merges over the whole file, so a batch
+# costs about the same however many rows came before it; a full copy of the hashes is only made
+# when every run merges into one, which happens every time the row count doubles.
+def hash_rows(df):
+    numeric = df.select_dtypes(include='number').columns
+    # Hash numbers as floats so a value hashes the same whether its batch was parsed as int or float
+    return pd.util.hash_pandas_object(df.astype({column: 'float64' for column in numeric}), index=False).to_numpy()
+
+class SeenRows:
+    def __init__(self):
+        self.runs = []
+
+    # Mask of rows that are neither repeated within the batch nor seen in an earlier batch
+    def first_seen(self, hashes):
+        # Searching sorted keys lets every binary search start where the previous one ended
+        order = np.argsort(hashes, kind='stable')
+        sorted_hashes = hashes[order]
+        seen = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, sorted_hashes), len(run) - 1)
+            seen |= run[positions] == sorted_hashes
+        # The first of equal hashes in the stable order is the first one in the batch
+        repeated = np.zeros(len(hashes), dtype=bool)
+        repeated[1:] = sorted_hashes[1:] == sorted_hashes[:-1]
+        keep_sorted = ~seen & ~repeated
+        self.add(sorted_hashes[keep_sorted])
+        keep = np.empty(len(hashes), dtype=bool)
+        keep[order] = keep_sorted
+        return keep
+
+    # Add sorted hashes not seen before as a new run and merge the runs that became too small
+    def add(self, hashes):
+        if not len(hashes):
+            return
+        self.runs.append(hashes)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            # Both runs are sorted, so the stable sort only merges them
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]), kind='stable')
+
+
+## Chunked cleaning
+# Read a CSV export with the text columns as strings, whole or in batches of chunksize rows
+def read_raw(path, chunksize=None):
+    return pd.read_csv(path, encoding='latin-1', chunksize=chunksize, dtype={column: str for column in RAW_TEXT_COLUMNS})
+
+# Read the CSV in batches and yield each batch cleaned with the same rules as cleandata.clean_data.
+# With a validation.Validator, every batch is validated once its duplicates are removed.
+def iter_clean_chunks(path=DATA_PATH, chunksize=DEFAULT_CHUNKSIZE, validator=None):
+    seen = SeenRows()
+    for chunk in read_raw(path, chunksize):
+        chunk = drop_rank(rename_columns(chunk))
+        chunk = chunk[seen.first_seen(hash_rows(chunk))]
+        if validator is not None:
+            chunk, _ = validator.validate(chunk)
+        for step in CHUNK_CLEANING_STEPS:
+            chunk = step(chunk)
+        if len(chunk):
+            yield chunk.reset_index(drop=True)
+
+
+# Write the cleaned batches to one Parquet file, one row group per batch. The rows are not sorted
+# by Subscribers; cleandata.sort_by_subscribers does that once the file is loaded.
+def ingest_to_parquet(path, out_path, chunksize=DEFAULT_CHUNKSIZE, validator=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    try:
+        for chunk in iter_clean_chunks(path, chunksize, validator):
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(out_path, schema)
+            # Cast to the first batch's schema, e.g. a column parsed as float in a batch with blanks
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+# Fold the cleaned batches into the Country/Category/Created Year cube used by the charts. With no
+# row left after cleaning the cube is empty, with the usual columns.
+def ingest_to_cube(path, chunksize=DEFAULT_CHUNKSIZE, validator=None):
+    cube = pd.DataFrame(columns=CUBE_KEYS + CUBE_MEASURES + ['Channels'])
+    for chunk in iter_clean_chunks(path, chunksize, validator):
+        partial = build_cube(chunk)
+        if len(cube):
+            partial = pd.concat([cube, partial]).groupby(CUBE_KEYS, as_index=False)[CUBE_MEASURES + ['Channels']].sum()
+        cube = partial
+    return cube
+
+
+
+## Parallel ingestion of many shards
+# CSV shards in a directory, or the files matching a glob pattern
+def shard_paths(source):
+    if os.path.isdir(source):
+        source = os.path.join(source, '*.csv')
+    return sorted(glob.glob(source))
+
+# Clean one shard in a worker; each row keeps the hash of its raw values for the global de-duplication
+def clean_shard(path):
+    df = drop_rank(rename_columns(read_raw(path)))
+    df['Row Hash'] = hash_rows(df)
+    df = df[~df['Row Hash'].duplicated()]
+    for step in CHUNK_CLEANING_STEPS:
+        df = step(df)
+    return df
+
+# Clean every shard in a process pool and merge them into one dataset, de-duplicated across shards
+# and ordered by Subscribers like cleandata.clean_data
+def ingest_shards(source, processes=None):
+    paths = shard_paths(source)
+    if not paths:
+        raise FileNotFoundError(f'No CSV shards found for {source}')
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        shards = list(pool.map(clean_shard, paths))
+    df = pd.concat(shards, ignore_index=True)
+    df = df[~df['Row Hash'].duplicated()].drop(columns='Row Hash')
+    return compact_dtypes(sort_by_subscribers(df))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean YouTube statistics exports in bounded-size batches or in parallel.')
+    parser.add_argument('path', nargs='?', default=DATA_PATH, help='CSV export to ingest, or a directory/glob of shards')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='rows per batch')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes for shards (default: all cores)')
+    parser.add_argument('--quarantine', help='validate every batch and append the bad rows to this CSV file (batched modes)')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--parquet', help='write the cleaned rows to this Parquet file')
+    output.add_argument('--cube', help='write the Country/Category/Created Year aggregates to this CSV file')
+    output.add_argument('--feather', help='clean every shard in parallel and write the merged dataset to this Feather file')
+    args = parser.parse_args()
+    if args.feather and args.quarantine:
+        parser.error('--quarantine only applies to the batched modes (--parquet, --cube), not to --feather')
+    validator = Validator(args.quarantine) if args.quarantine else None
+
+    if args.feather:
+        df = ingest_shards(args.path, args.processes)
+        print(f'Wrote {len(df)} rows to {write_cache(df, args.feather)}')
+    elif args.parquet:
+        print(f'Wrote {ingest_to_parquet(args.path, args.parquet, args.chunksize, validator)} rows to {args.parquet}')
+    else:
+        cube = ingest_to_cube(args.path, args.chunksize, validator)
+        cube.to_csv(args.cube, index=False)
+        print(f'Wrote {len(cube)} cells to {args.cube}')
+    if validator is not None:
+        print(validator.report().to_string(index=False))
@@ -0,0 +1,88 @@
+from cube import collapse_rest, get_cube, rollup
+from ranking import get_rank_table
+from search import get_search_index
+from spatial import country_bins, get_country_locations
+from synopsis import get_synopsis
+from topk import get_topk
+
+
+# Columns each question filters on
+QUESTION_FILTERS = {
+    'Question 1': ['Country', 'Category'],
+    'Question 2': ['Country', 'Created Year'],
+    'Question 3': ['Category', 'Created Year'],
+    'Question 4': ['Country', 'Category'],
+    'Question 5': ['Category', 'Created Year'],
+}
+
+# Marks drawn in the compact rendering mode: pie slices of Question 2, countries and categories
+# (bars per country) of Question 3; the rest of each is merged into 'Other'
+COMPACT_CATEGORIES = 8
+COMPACT_COUNTRIES = 15
+COMPACT_COUNTRY_CATEGORIES = 6
+
+# Columns of the channels found by a search
+SEARCH_RESULT_COLUMNS = ['Rank', 'Youtuber', 'Title', 'Country', 'Category', 'Subscribers', 'Video Views']
+
+
+## The dashboard's questions
+# Answered from the structures built once per cleaned frame (top-K orderings, the cube), so the
+# dashboard and the JSON API (api.py) give the same answers without scanning the channel rows.
+
+# Question 1: the n channels with the largest metric among the selected countries and categories
+def top_channels(df, metric, selections, n=10):
+    return get_topk(df).top_frame(df, metric, n, selections)
+
+# Question 2: Subscribers and Video Views per category for the selected countries and years
+def category_totals(df, selections):
+    return rollup(get_cube(df), 'Category', selections)
+
+def most_popular_category(totals, column='Subscribers'):
+    return totals.loc[totals[column].idxmax(), 'Category']
+
+def compact_category_totals(totals):
+    return collapse_rest(totals, 'Category', COMPACT_CATEGORIES)
+
+# Question 3: average Subscribers per country and category for the selected categories and years
+def country_category_averages(df, selections):
+    return rollup(get_cube(df), ['Country', 'Category'], selections)
+
+def compact_country_category_averages(averages):
+    averages = collapse_rest(averages, 'Country', COMPACT_COUNTRIES)
+    return collapse_rest(averages, 'Category', COMPACT_COUNTRY_CATEGORIES)
+
+# Question 4: the n channels with the largest earnings or 30-day growth metric among the selected
+# countries and categories, and where one channel (a row) ranks within its country and category
+def top_earners(df, metric, selections, n=10):
+    return df.take(get_rank_table(df).top_rows(metric, n, selections))
+
+def channel_standing(df, row):
+    return get_rank_table(df).standing(row)
+
+# Question 5: per-country totals and per-capita ratios for the selected categories and years, with
+# each country's location for the map
+def country_map(df, selections):
+    return country_bins(get_cube(df), get_country_locations(df), selections)
+
+
+## Approximate mode
+# The same answers from the bounded synopsis of the frame (synopsis.py), so they take the same time
+# whatever the number of channels. Sums and averages come with '<column> Error' columns holding the
+# half-width of their 95% confidence interval; the top channels are exact.
+def approximate_top_channels(df, metric, selections, n=10):
+    return get_synopsis(df).top(metric, selections, n)
+
+def approximate_category_totals(df, selections):
+    return get_synopsis(df).rollup('Category', selections)
+
+def approximate_country_category_averages(df, selections):
+    return get_synopsis(df).rollup(['Country', 'Category'], selections)
+
+
+## Channel search
+# Channels whose name or title starts with the query, then the closest spellings (search.py). Rank
+# is the channel's position by Subscribers, which is the row's position in the cleaned frame.
+def search_channels(df, query, n=10):
+    rows = get_search_index(df).search(query, n)
+    found = df.take(rows).assign(Rank=rows + 1)
+    return found[SEARCH_RESULT_COLUMNS].reset_index(drop=True)
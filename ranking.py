@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from cleandata import cached_per_frame
+from filters import get_filter_index
+from topk import TopK
+
+
+# Metrics ranked within every country and category: the earnings estimates and the 30-day growth
+RANKED_METRICS = [
+    'Highest Yearly Earnings',
+    'Lowest Yearly Earnings',
+    'Highest Monthly Earnings',
+    'Lowest Monthly Earnings',
+    'Video Views For The Last 30 Days',
+    'Subscribers For Last 30 Days',
+]
+RANK_COLUMNS = ['Country', 'Category']
+
+
+## Rank and percentile tables
+# Built once per frame from the top-K orderings of the ranked metrics (topk.py): within each value
+# of a rank column the grouped ordering already lists the rows largest first, so a row's rank is
+# its position in that list minus the value's offset. Channels with equal values share the best
+# rank of the tie. Every row gets its rank, the size of its group and its percentile (the share of
+# its group it ranks at or above) per metric and column, so looking up a channel reads a few array
+# elements whatever the number of channels.
+class RankTable:
+    def __init__(self, top, values, ranks, sizes):
+        self.top = top
+        self.values = values
+        self.ranks = ranks
+        self.sizes = sizes
+
+    @classmethod
+    def build(cls, df, filter_index, metrics=RANKED_METRICS, columns=RANK_COLUMNS):
+        top = TopK.build(df, filter_index, metrics, columns)
+        values, ranks, sizes = {}, {}, {}
+        for metric in metrics:
+            values[metric] = df[metric].to_numpy()
+            for column in columns:
+                ranks[metric, column], sizes[metric, column] = group_ranks(
+                    top.grouped[metric, column], filter_index.codes[column], filter_index.offsets[column], values[metric])
+        return cls(top, values, ranks, sizes)
+
+    def percentile(self, metric, column, row):
+        size = self.sizes[metric, column][row]
+        return 100.0 * (size - self.ranks[metric, column][row] + 1) / size
+
+    # Where a channel (a row of the frame) stands in its country and category for every metric
+    def standing(self, row):
+        records = []
+        for metric in self.values:
+            record = {'Metric': metric, 'Value': self.values[metric][row]}
+            for column in self.top.columns:
+                record[f'{column} Rank'] = int(self.ranks[metric, column][row])
+                record[f'{column} Channels'] = int(self.sizes[metric, column][row])
+                record[f'{column} Percentile'] = round(self.percentile(metric, column, row), 1)
+            records.append(record)
+        return pd.DataFrame(records)
+
+    # Row ids of the n largest values of metric among the rows matching the selections
+    def top_rows(self, metric, n=10, selections=None):
+        return self.top.top(metric, n, selections)
+
+
+# 1-based rank within its group of every row, and the size of the group, from the rows grouped by
+# code with the largest values first
+def group_ranks(grouped, codes, offsets, values):
+    positions = np.arange(len(grouped))
+    sorted_codes, sorted_values = codes[grouped], values[grouped]
+    # A tie continues the run of the row before it; every row takes the start of its run
+    starts = np.ones(len(grouped), dtype=bool)
+    starts[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+    run_starts = np.maximum.accumulate(np.where(starts, positions, 0))
+    ranks = np.empty(len(grouped), dtype=np.int32)
+    ranks[grouped] = run_starts - offsets[sorted_codes] + 1
+    sizes = np.diff(offsets).astype(np.int32)[codes]
+    return ranks, sizes
+
+
+def build_rank_table(df):
+    return RankTable.build(df, get_filter_index(df))
+
+
+get_rank_table = cached_per_frame(build_rank_table)
@@ -0,0 +1,225 @@
+import bisect
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from cleandata import DATA_PATH, cache_is_fresh, cache_path_for, cached_per_frame
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+except ImportError:  # search needs pyarrow; the rest of the dashboard doesn't
+    pa = pc = feather = None
+
+
+# Columns searched; both hold names normalized by textclean.py
+SEARCH_COLUMNS = ['Youtuber', 'Title']
+
+# Candidates kept from a prefix range before picking the best ranked channels
+PREFIX_WINDOW = 1024
+
+# Rows compared between a persisted index and the frame it is opened for
+FINGERPRINT_ROWS = 32
+
+# A fuzzy match must share at least this fraction of the query's trigrams
+MIN_SHARED = 0.4
+
+
+def search_path_for(path):
+    return os.path.splitext(path)[0] + '.search'
+
+# Lowercase with single spaces between words, the form names are indexed in
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+# Distinct trigrams of each string of an Arrow string array, as (code, string number) pairs sorted
+# by code, where the code packs three UTF-8 bytes into an integer. Strings are padded with a space on
+# both sides so trigrams also mark where words start and end; computed on the array's buffers directly.
+def trigrams(strings):
+    padded = pc.binary_join_element_wise(' ', pc.fill_null(strings, ''), ' ', '')
+    _, offsets_buffer, data_buffer = padded.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int32)[padded.offset:padded.offset + len(padded) + 1]
+    data = np.frombuffer(data_buffer, dtype=np.uint8)[offsets[0]:offsets[-1]].astype(np.uint64)
+    offsets = offsets - offsets[0]
+    owner = np.repeat(np.arange(len(padded), dtype=np.uint64), np.diff(offsets))
+    starts = np.arange(len(data) - 2)
+    starts = starts[starts + 2 < offsets[owner[starts].astype(np.int64) + 1]]
+    codes = (data[starts] << np.uint64(16)) | (data[starts + 1] << np.uint64(8)) | data[starts + 2]
+    # One sort of code-major keys both groups the postings and finds the repeats (np.unique is
+    # much slower on these keys)
+    pairs = np.sort((codes << np.uint64(32)) | owner[starts])
+    pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])]
+    return (pairs >> np.uint64(32)).astype(np.uint32), (pairs & np.uint64(0xFFFFFFFF)).astype(np.int32)
+
+
+## Search index over channel names
+# - Prefix search: every normalized name and every word of it, sorted, with the row it belongs to.
+#   A prefix is a contiguous range of the sorted keys, found by binary search (the flat equivalent
+#   of walking a trie). Rows are the frame's positions, which are also Subscribers ranks.
+# - Typo-tolerant search: the posting list (documents holding it) of every trigram. A query scores
+#   documents by the trigrams they share with it, so 'mrbaest' still finds 'mrbeast'.
+# Documents are the Youtuber values followed by the Title values. Everything lives in flat arrays,
+# persisted next to the columnar cache and memory-mapped on load.
+class SearchIndex:
+    def __init__(self, n_rows, keys, key_rows, codes, offsets, postings, document_trigrams):
+        self.n_rows = n_rows
+        self.keys = keys
+        self.key_rows = key_rows
+        self.codes = codes
+        self.offsets = offsets
+        self.postings = postings
+        self.document_trigrams = document_trigrams
+
+    @classmethod
+    def build(cls, df):
+        if pa is None:
+            raise ImportError('pyarrow is required for the search index')
+        documents = pa.concat_arrays([pa.array(df[column], type=pa.string(), from_pandas=True) for column in SEARCH_COLUMNS])
+        names = pc.utf8_lower(pc.fill_null(documents, ''))
+        document_rows = np.tile(np.arange(len(df), dtype=np.int32), len(SEARCH_COLUMNS))
+
+        # Keys: each whole name (for prefixes spanning words) and each of its words
+        words = pc.utf8_split_whitespace(names)
+        whole = pc.binary_join(words, ' ')
+        keys = pa.concat_arrays([whole, pc.list_flatten(words)])
+        key_rows = np.concatenate([document_rows, document_rows[pc.list_parent_indices(words).to_numpy()]])
+        order = pc.sort_indices(keys).to_numpy()
+        keys, key_rows = keys.take(order), key_rows[order]
+
+        # Trigram posting lists, sorted by trigram
+        codes, postings = trigrams(whole)
+        starts = np.flatnonzero(np.append(True, codes[1:] != codes[:-1]))
+        unique_codes, offsets = codes[starts], np.append(starts, len(codes)).astype(np.int64)
+        document_trigrams = np.bincount(postings, minlength=len(whole)).astype(np.int32)
+        return cls(len(df), keys, key_rows, unique_codes, offsets, postings, document_trigrams)
+
+    # Row ids of the channels with a name or a word starting with the prefix, best ranked first
+    def prefix(self, query, limit=10):
+        query = normalize_query(query)
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        keys = ArrowSequence(self.keys)
+        start = bisect.bisect_left(keys, query)
+        end = bisect.bisect_left(keys, query + '\U0010ffff', lo=start)
+        rows = self.key_rows[start:end]
+        if len(rows) > PREFIX_WINDOW:
+            rows = np.partition(rows, PREFIX_WINDOW)[:PREFIX_WINDOW]
+        return np.unique(rows)[:limit]
+
+    # Row ids of the channels whose names share the most trigrams with the query, most similar first
+    # (ties by rank). Similarity is shared / (query + document - shared) trigrams.
+    def fuzzy(self, query, limit=10):
+        query = normalize_query(query)
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        query_codes, _ = trigrams(pa.array([query]))
+        positions = np.searchsorted(self.codes, query_codes)
+        positions = positions[(positions < len(self.codes)) & (self.codes[np.minimum(positions, len(self.codes) - 1)] == query_codes)]
+        if not len(positions):
+            return np.empty(0, dtype=np.int64)
+        documents = np.concatenate([self.postings[self.offsets[p]:self.offsets[p + 1]] for p in positions])
+        shared = np.bincount(documents, minlength=len(self.document_trigrams))
+        candidates = np.flatnonzero(shared >= max(1, MIN_SHARED * len(query_codes)))
+        scores = shared[candidates] / (len(query_codes) + self.document_trigrams[candidates] - shared[candidates])
+        rows = candidates % self.n_rows
+        order = np.lexsort((rows, -scores))
+        rows = rows[order]
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)][:limit]
+
+    # Prefix matches first, then typo-tolerant matches
+    def search(self, query, limit=10):
+        rows = list(self.prefix(query, limit))
+        if len(rows) < limit:
+            rows += [row for row in self.fuzzy(query, limit) if row not in rows][:limit - len(rows)]
+        return np.array(rows, dtype=np.int64)
+
+    ## Persistence
+    # A directory of Arrow and numpy files, replaced as a whole so readers never mix two versions.
+    # It is written to a directory unique to the writer, as several processes may build the index at
+    # once; when another writer swapped in its (equivalent) index first, this one is dropped.
+    def write(self, directory, meta):
+        parent, name = os.path.split(os.path.abspath(directory))
+        tmp_directory = tempfile.mkdtemp(dir=parent, prefix=name + '.', suffix='.tmp')
+        try:
+            feather.write_feather(pa.table({'Key': self.keys, 'Row': self.key_rows}), os.path.join(tmp_directory, 'keys.feather'),
+                                  compression='uncompressed', chunksize=max(len(self.keys), 1))
+            for array in ['codes', 'offsets', 'postings', 'document_trigrams']:
+                np.save(os.path.join(tmp_directory, array + '.npy'), getattr(self, array))
+            with open(os.path.join(tmp_directory, 'meta.json'), 'w') as file:
+                json.dump(meta, file)
+            # A directory can only be renamed over an empty one, so the current index is moved aside
+            # first; readers that already opened its files keep them
+            old_directory = tempfile.mkdtemp(dir=parent, prefix=name + '.', suffix='.tmp')
+            try:
+                os.replace(directory, old_directory)
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(tmp_directory, directory)
+            except OSError:
+                pass  # another writer's index took the place
+            shutil.rmtree(old_directory, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+        return directory
+
+    @classmethod
+    def read(cls, directory):
+        with open(os.path.join(directory, 'meta.json')) as file:
+            meta = json.load(file)
+        table = feather.read_table(os.path.join(directory, 'keys.feather'), memory_map=True)
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+                  for name in ['codes', 'offsets', 'postings', 'document_trigrams']}
+        keys = table.column('Key').combine_chunks()
+        return meta, cls(meta['fingerprint'][0], keys, table.column('Row').to_numpy(), **arrays)
+
+
+# A cheap check that a persisted index belongs to a frame: its row count and the names at a few
+# evenly spaced rows
+def frame_fingerprint(df):
+    positions = np.linspace(0, len(df) - 1, FINGERPRINT_ROWS).astype(np.int64) if len(df) else []
+    return [len(df), [str(value) for value in df['Youtuber'].take(positions)]]
+
+
+# Binary search needs indexing and a length; Arrow arrays give values by position without
+# converting the whole array to Python strings
+class ArrowSequence:
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, position):
+        return self.array[position].as_py()
+
+
+# The index of a frame loaded from `path`: read from disk when it was built from the current columnar
+# cache for the same rows, otherwise built and written next to the cache. Without a fresh cache (the
+# frame came from the CSV) the index only lives in memory.
+def open_search_index(df, path=DATA_PATH):
+    cache_path = cache_path_for(path)
+    directory = search_path_for(path)
+    if not cache_is_fresh(path, cache_path):
+        return SearchIndex.build(df)
+    meta = {'source_mtime': os.stat(cache_path).st_mtime_ns, 'fingerprint': frame_fingerprint(df)}
+    try:
+        stored, index = SearchIndex.read(directory)
+        if stored == meta:
+            return index
+    except OSError:
+        pass  # no index yet, or another process is replacing it
+    index = SearchIndex.build(df)
+    try:
+        index.write(directory, meta)
+    except OSError:
+        pass  # read-only data directory, the index stays in memory
+    return index
+
+
+get_search_index = cached_per_frame(open_search_index)
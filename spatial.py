@@ -0,0 +1,52 @@
+from cleandata import cached_per_frame
+from cube import CUBE_MEASURES, rollup
+from filters import get_filter_index
+
+
+# Country attributes carried by every row; the same for every channel of a country
+LOCATION_COLUMNS = ['Latitude', 'Longitude', 'Population']
+
+# Measures of the map: the cube's sums and channel count per country, and the same against the
+# country's population (column, people per unit)
+MAP_MEASURES = CUBE_MEASURES + ['Channels']
+PER_CAPITA = {
+    'Subscribers': ('Subscribers per Person', 1),
+    'Video Views': ('Video Views per Person', 1),
+    'Channels': ('Channels per Million People', 1_000_000),
+}
+
+
+## Spatial bins for the map
+# The coordinates and population in the dataset are the country's, so a country is the finest
+# spatial bin there is: channels are binned per country through the cube (cube.py), whose
+# (Country, Category, Created Year) cells already answer any Category/Created Year filter. The map
+# rolls the matching cells up to one bin per country and joins the country locations, so its cost
+# follows the number of countries, never the number of channels, and only one row per country is
+# sent to the browser.
+
+# One row per located country with its coordinates and population. Read from the first row of each
+# country in the filter index, so building it doesn't scan the frame. Rows without a country
+# ('Unknown', at 0, 0 with no population) are left out.
+def build_country_locations(df):
+    index = get_filter_index(df)
+    offsets, row_ids = index.offsets['Country'], index.row_ids['Country']
+    locations = df.take(row_ids[offsets[:-1]])[['Country'] + LOCATION_COLUMNS]
+    locations = locations.astype({'Country': object, 'Population': 'int64'})
+    return locations[locations['Population'] > 0].reset_index(drop=True)
+
+
+get_country_locations = cached_per_frame(build_country_locations)
+
+
+# Per-country bins for the selections: totals, averages and per-capita ratios with the location.
+# Channels without a location keep their bin with missing coordinates and ratios, so the map can
+# say how many channels it leaves out.
+def country_bins(cube, locations, selections=None):
+    totals = rollup(cube, 'Country', selections)
+    bins = totals.astype({'Country': object}).merge(locations, on='Country', how='left')
+    for measure, (column, people) in PER_CAPITA.items():
+        bins[column] = bins[measure] / bins['Population'] * people
+    return bins
+
+def located(bins):
+    return bins[bins['Latitude'].notna()]
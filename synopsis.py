@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from cleandata import cached_per_frame
+from cube import CUBE_KEYS, CUBE_MEASURES, add_averages
+from topk import TOPK_COLUMNS, TOPK_METRICS
+
+
+# Rows sampled per (Country, Category, Created Year) cell and channels kept per (Country, Category)
+SAMPLE_PER_CELL = 64
+TOP_PER_CELL = 10
+
+# Normal quantile of the reported error bounds (95% confidence intervals)
+Z = 1.96
+
+
+# The key columns as plain values: categoricals of different batches don't share categories
+def plain_keys(rows, columns):
+    return rows.astype({column: object for column in columns if rows[column].dtype == 'category'})
+
+
+## Bounded synopsis of a snapshot for the approximate query mode
+# Its size depends on the number of cells, not on the number of channels, so answering from it
+# takes the same time whatever the size of the snapshot. It holds:
+# - the exact number of channels per (Country, Category, Created Year) cell,
+# - a uniform sample of up to SAMPLE_PER_CELL channels per cell (bottom-k by a random priority),
+#   from which sums and averages are estimated with a stratified estimator and an error bound,
+# - the TOP_PER_CELL largest channels per (Country, Category) for every metric. Channels are
+#   unique, so the top 10 of any Country/Category selection is among them and is exact.
+# A synopsis is built in one pass over batches (update), e.g. from ingest.iter_clean_chunks for a
+# snapshot too large to load, and batches can be added in any order.
+class Synopsis:
+    def __init__(self, per_cell=SAMPLE_PER_CELL, top_per_cell=TOP_PER_CELL, seed=0):
+        self.per_cell = per_cell
+        self.top_per_cell = top_per_cell
+        self.rng = np.random.default_rng(seed)
+        self.counts = None
+        self.sample = None
+        self.cells = None
+        self.tops = {}
+
+    @classmethod
+    def build(cls, df):
+        return cls().update(df)
+
+    def update(self, df):
+        # Batches are reduced to the rows they contribute before their keys are converted to plain
+        # values (see plain_keys)
+        counts = plain_keys(df[CUBE_KEYS], CUBE_KEYS).value_counts()
+        self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0).astype('int64')
+
+        # Bottom-k sampling: the rows with the smallest random priorities of a cell are a uniform
+        # sample of it, and stay one when the samples of two batches are merged the same way
+        priority = self.rng.random(len(df))
+        order = np.argsort(priority)
+        kept = order[df[CUBE_KEYS].take(order).reset_index(drop=True).groupby(CUBE_KEYS, observed=True).head(self.per_cell).index]
+        sample = plain_keys(df[CUBE_KEYS + CUBE_MEASURES].take(kept), CUBE_KEYS).assign(Priority=priority[kept])
+        if self.sample is not None:
+            sample = pd.concat([self.sample, sample], ignore_index=True)
+            sample = sample.sort_values('Priority').groupby(CUBE_KEYS).head(self.per_cell)
+        self.sample = sample.reset_index(drop=True)
+        self.cells = None
+
+        columns = ['Youtuber'] + TOPK_COLUMNS + TOPK_METRICS
+        for metric in TOPK_METRICS:
+            ranked = df[columns].sort_values(metric, ascending=False, kind='stable')
+            top = plain_keys(ranked.groupby(TOPK_COLUMNS, observed=True).head(self.top_per_cell), TOPK_COLUMNS)
+            if metric in self.tops:
+                top = pd.concat([self.tops[metric], top], ignore_index=True).sort_values(metric, ascending=False, kind='stable')
+                top = top.groupby(TOPK_COLUMNS).head(self.top_per_cell)
+            self.tops[metric] = top.reset_index(drop=True)
+        return self
+
+    # Per cell: the number of channels and the estimated total of every measure with the variance
+    # of the estimate (stratified estimator with the finite population correction). Cells sampled
+    # whole have no variance.
+    def cell_estimates(self):
+        if self.cells is None:
+            grouped = self.sample.groupby(CUBE_KEYS)[CUBE_MEASURES]
+            means, variances, sampled = grouped.mean(), grouped.var().fillna(0), grouped.size()
+            population = self.counts.reindex(sampled.index).astype('float64')
+            cells = pd.DataFrame({'Channels': population.astype('int64')}, index=sampled.index)
+            for measure in CUBE_MEASURES:
+                cells[measure] = population * means[measure]
+                cells[f'{measure} Variance'] = population ** 2 * (1 - sampled / population) * variances[measure] / sampled
+            self.cells = cells.reset_index()
+        return self.cells
+
+    # Top n channels by a metric for Country/Category selections; exact for n <= top_per_cell
+    def top(self, metric, selections, n=10):
+        if n > self.top_per_cell:
+            raise ValueError(f'The synopsis keeps the top {self.top_per_cell} channels per cell')
+        top = self.tops[metric]
+        for column, values in selections.items():
+            if values:
+                top = top[top[column].isin(values)]
+        return top.head(n).reset_index(drop=True)
+
+    # Estimated rollup to the `by` columns of the cells matching the selections: the columns of
+    # cube.rollup, plus '<column> Error' with the half-width of the 95% confidence interval of
+    # every estimated sum and average. Channel counts are exact.
+    def rollup(self, by, selections=None):
+        cells = self.cell_estimates()
+        for column, values in (selections or {}).items():
+            if values is not None and len(values):
+                cells = cells[cells[column].isin(values)]
+        totals = cells.groupby(by)[[column for column in cells.columns if column not in CUBE_KEYS]].sum()
+        for measure in CUBE_MEASURES:
+            totals[f'{measure} Error'] = Z * np.sqrt(totals.pop(f'{measure} Variance'))
+        totals = add_averages(totals)
+        for measure in CUBE_MEASURES:
+            totals[f'Average {measure} Error'] = totals[f'{measure} Error'] / totals['Channels']
+        return totals.reset_index()
+
+
+get_synopsis = cached_per_frame(Synopsis.build)
@@ -0,0 +1,55 @@
+import re
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # fall back to Python's re, one pass per value
+    pa = pc = None
+
+
+# Characters kept in 'Youtuber' and 'Title'; the same rule as cleandata.pattern
+unwanted = re.compile(r'[^a-zA-Z0-9\s.,!?&\'-]')
+
+# Python's \s and str.strip() use str.isspace(); Arrow's regex engine (RE2) only knows ASCII
+# whitespace, so the whitespace characters are spelled out for it. This is every character for
+# which str.isspace() is true, listed rather than found by testing all code points on import.
+WHITESPACE = ('\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006'
+              '\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000')
+ARROW_UNWANTED = "[^a-zA-Z0-9.,!?&'\\-" + ''.join(f'\\x{{{ord(character):x}}}' for character in WHITESPACE) + ']'
+
+
+## Text normalization for 'Youtuber' and 'Title'
+# Removing the unwanted characters and trimming whitespace happen in one stage per column: with
+# pyarrow as two vectorized Arrow string kernels, otherwise as one Python pass with a compiled
+# regex. With pyarrow a caller reloading the same source can pass a memo (a dict, see
+# cleandata.load_data): the raw and cleaned values of each column are kept in it, so on the next
+# load the values that did not change (the bulk of a new export) are looked up instead of cleaned.
+def normalize_arrow(values):
+    return pc.utf8_trim(pc.replace_substring_regex(values, ARROW_UNWANTED, ''), WHITESPACE)
+
+# Clean an Arrow string array, reusing the cleaned values of the memo's previous load of the column
+def _normalize_with_memo(memo, name, values):
+    previous = memo.get(name)
+    if previous is None:
+        cleaned = normalize_arrow(values)
+    else:
+        previous_values, previous_cleaned = previous
+        positions = pc.index_in(values, value_set=previous_values)
+        new = pc.is_null(positions)
+        cleaned = pc.replace_with_mask(previous_cleaned.take(positions), new, normalize_arrow(values.filter(new)))
+    memo[name] = values, cleaned
+    return cleaned
+
+def normalize(value):
+    return unwanted.sub('', value).strip()
+
+# Remove unwanted characters and trim whitespace in a text column; missing values stay missing
+def normalize_series(series, memo=None):
+    if pa is None:
+        return pd.Series([normalize(value) if isinstance(value, str) else value for value in series.to_numpy(dtype=object)],
+                         index=series.index, name=series.name, dtype=object)
+    values = pa.array(series, type=pa.string(), from_pandas=True)
+    cleaned = normalize_arrow(values) if memo is None else _normalize_with_memo(memo, series.name, values)
+    return pd.Series(pd.arrays.ArrowStringArray(cleaned), index=series.index, name=series.name)
@@ -0,0 +1,90 @@
+import numpy as np
+
+from cleandata import cached_per_frame
+from filters import get_filter_index
+
+
+# Metrics with precomputed orderings and the filter columns they are grouped by
+TOPK_METRICS = ['Subscribers', 'Video Views']
+TOPK_COLUMNS = ['Country', 'Category']
+
+
+## Top-K leaderboards without sorting on every click
+# For every metric the row ids are ordered once, largest first, both globally and grouped by each
+# value of the filter columns (sharing the filter index's value offsets). The top N for a filter is
+# read off the front of the selected values' lists: each list is only examined up to the point
+# where it holds N rows passing the other filters, so a query touches roughly N rows per selected
+# value instead of sorting the filtered frame.
+class TopK:
+    # orders maps every metric to the row ids ordered by that metric, largest first
+    def __init__(self, filter_index, orders, columns=TOPK_COLUMNS):
+        self.filter_index = filter_index
+        self.columns = columns
+        self.orders = orders
+        self.ranks = {}
+        self.grouped = {}
+        for metric, order in orders.items():
+            ranks = np.empty_like(order)
+            ranks[order] = np.arange(len(order))
+            self.ranks[metric] = ranks
+            for column in columns:
+                # Rows grouped by value like the filter index, best rank first within each value
+                codes = filter_index.codes[column]
+                self.grouped[metric, column] = order[np.argsort(codes[order], kind='stable')]
+
+    # Order the rows of a frame by every metric
+    @classmethod
+    def build(cls, df, filter_index, metrics=TOPK_METRICS, columns=TOPK_COLUMNS):
+        orders = {metric: np.argsort(-df[metric].to_numpy(), kind='stable') for metric in metrics}
+        return cls(filter_index, orders, columns)
+
+    # Row ids of the n largest values of metric among the rows matching the selections, largest first
+    def top(self, metric, n=10, selections=None):
+        index = self.filter_index
+        active = {column: values for column, values in (selections or {}).items() if values is not None and len(values)}
+        if not active:
+            return self.orders[metric][:n]
+        grouped_columns = [column for column in active if (metric, column) in self.grouped]
+        if not grouped_columns:
+            return self._top_of_rows(metric, n, index.select(active))
+
+        # Walk the lists of the most selective grouped column, check the other columns by code
+        start = min(grouped_columns, key=lambda column: index.count(column, active[column]))
+        offsets, grouped = index.offsets[start], self.grouped[metric, start]
+        others = [(index.codes[column], index.code_mask(column, values))
+                  for column, values in active.items() if column != start]
+        candidates = []
+        for code in index.selected_codes(start, active[start]):
+            rows = grouped[offsets[code]:offsets[code + 1]]
+            length = n
+            while True:
+                head = rows[:length]
+                for codes, mask in others:
+                    head = head[mask[codes[head]]]
+                # Enough rows from this value, or nothing left to look at
+                if len(head) >= n or length >= len(rows):
+                    break
+                length *= 2
+            candidates.append(head[:n])
+        if not candidates:
+            return np.empty(0, dtype=np.intp)
+        return self._top_of_rows(metric, n, np.concatenate(candidates))
+
+    # Partial selection of the n best rows out of an arbitrary set of row ids
+    def _top_of_rows(self, metric, n, rows):
+        ranks = self.ranks[metric][rows]
+        if len(rows) > n:
+            keep = np.argpartition(ranks, n)[:n]
+            rows, ranks = rows[keep], ranks[keep]
+        return rows[np.argsort(ranks)]
+
+    # Top n rows of df for a metric and filter, as a frame
+    def top_frame(self, df, metric, n=10, selections=None):
+        return df.take(self.top(metric, n, selections))
+
+
+def build_topk(df):
+    return TopK.build(df, get_filter_index(df))
+
+
+get_topk = cached_per_frame(build_topk)
@@ -0,0 +1,195 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from cleandata import CLEANING_STEPS, DATA_PATH, drop_duplicate_rows, float_to_int_columns, read_data
+
+
+# Columns of a renamed export and whether they hold text or numbers
+TEXT_COLUMNS = ['Youtuber', 'Category', 'Title', 'Country', 'Abbreviation', 'Channel Type', 'Created Month']
+NUMBER_COLUMNS = [
+    'Subscribers', 'Video Views', 'Uploads', 'Video Views Rank', 'Country Rank', 'Channel Type Rank',
+    'Video Views For The Last 30 Days', 'Lowest Monthly Earnings', 'Highest Monthly Earnings',
+    'Lowest Yearly Earnings', 'Highest Yearly Earnings', 'Subscribers For Last 30 Days', 'Created Year',
+    'Created Date', 'Gross Tertiary Education Enrollment (%)', 'Population', 'Unemployment Rate',
+    'Urban Population', 'Latitude', 'Longitude',
+]
+
+# Counts that can't be negative
+COUNT_COLUMNS = ['Subscribers', 'Video Views', 'Uploads', 'Video Views For The Last 30 Days', 'Population', 'Urban Population']
+
+# Integers convert to int64 from -2**63 up to, but not including, 2**63. Compared as float64, the
+# largest int64 rounds up to 2**63, so floats need a strict upper bound.
+INT64 = np.iinfo(np.int64)
+INT64_FLOAT_LIMIT = 2.0 ** 63
+
+
+## Checks
+# Each takes a column and returns a boolean Series, True where the value passes. Missing values
+# pass every check but 'required': cleaning fills them with 'Unknown' or 0 by design.
+def present(values):
+    if values.dtype == object:
+        return values.notna() & (values != '')
+    return values.notna() & (values != 0)
+
+def whole_number(values):
+    numbers = values.to_numpy(dtype='float64')
+    return pd.Series(np.isnan(numbers) | (np.trunc(numbers) == numbers), index=values.index)
+
+def fits_int64(values):
+    if values.dtype.kind == 'i':
+        return pd.Series(True, index=values.index)
+    if values.dtype.kind == 'u':
+        return values <= INT64.max
+    return values.isna() | ((values >= -INT64_FLOAT_LIMIT) & (values < INT64_FLOAT_LIMIT))
+
+def non_negative(values):
+    return values.isna() | (values >= 0)
+
+def between(low, high):
+    def check(values):
+        return values.isna() | values.between(low, high)
+    return check
+
+# Stateful check for validating batch by batch: a value passes the first time it is seen, in this
+# batch or any earlier one
+def first_occurrence():
+    from ingest import SeenRows
+
+    seen = SeenRows()
+
+    def check(values):
+        hashes = pd.util.hash_array(values.to_numpy(dtype=object), categorize=False)
+        return pd.Series(seen.first_seen(hashes), index=values.index)
+    return check
+
+
+## Rules
+# A named check applied to columns. 'quarantine' rules move the failing rows to the quarantine
+# output; 'flag' rules only count them in the report.
+class Rule:
+    def __init__(self, name, columns, check, action='quarantine'):
+        self.name = name
+        self.columns = columns
+        self.check = check
+        self.action = action
+
+
+# The rules of the YouTube statistics export. The rows cleandata.remove_invalid_rows drops (no
+# name, no views, no creation year) are quarantined with their reason instead of disappearing.
+# Built per validation run, as the uniqueness rule remembers the names it has seen.
+def default_rules():
+    return [
+        Rule('required', ['Youtuber', 'Video Views', 'Created Year'], present),
+        Rule('whole number', float_to_int_columns, whole_number),
+        Rule('fits int64', float_to_int_columns, fits_int64),
+        Rule('non-negative', COUNT_COLUMNS, non_negative),
+        Rule('unique', ['Youtuber'], first_occurrence()),
+        Rule('created since 2005', ['Created Year'], between(2005, pd.Timestamp.now().year), action='flag'),
+        Rule('latitude', ['Latitude'], between(-90, 90), action='flag'),
+        Rule('longitude', ['Longitude'], between(-180, 180), action='flag'),
+    ]
+
+
+## Validation
+# Append quarantined rows to a CSV file, writing the header when the file is new
+def write_quarantine(quarantined, path):
+    if len(quarantined):
+        quarantined.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+
+# Validates frames (a whole export or its batches, in order) against the rules, appends the rows
+# to quarantine to a CSV file when one is given, and accumulates what failed and how long every
+# rule took over all of them
+class Validator:
+    def __init__(self, quarantine_path=None, rules=None):
+        self.quarantine_path = quarantine_path
+        self.rules = default_rules() if rules is None else rules
+        self.failures = {}
+        self.seconds = {}
+
+    def _record(self, name, failed, seconds):
+        self.failures[name] = self.failures.get(name, 0) + failed
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    # Check a renamed raw frame. Columns are first checked against the schema: a missing column
+    # raises ValueError, and number columns read as text (malformed values such as '1,234' or
+    # 'n/a') are parsed, with the values that aren't numbers quarantined. Returns the rows that
+    # pass, with number columns parsed, and the quarantined rows as read, with their reasons.
+    def validate(self, df):
+        missing = [column for column in TEXT_COLUMNS + NUMBER_COLUMNS if column not in df.columns]
+        if missing:
+            raise ValueError(f'Columns missing from the export: {", ".join(missing)}')
+
+        raw = df
+        reasons = []
+        start = time.perf_counter()
+        parsed = {}
+        for column in NUMBER_COLUMNS:
+            if not pd.api.types.is_numeric_dtype(df[column]):
+                parsed[column] = pd.to_numeric(df[column], errors='coerce')
+                reasons.append((f'number: {column}', parsed[column].isna() & df[column].notna()))
+        if parsed:
+            df = df.assign(**parsed)
+        self._record('number', sum(int(failed.sum()) for _, failed in reasons), time.perf_counter() - start)
+
+        for rule in self.rules:
+            start = time.perf_counter()
+            failed_rows = 0
+            for column in rule.columns:
+                failed = ~rule.check(df[column])
+                failed_rows += int(failed.sum())
+                if rule.action == 'quarantine':
+                    reasons.append((f'{rule.name}: {column}', failed))
+            self._record(rule.name, failed_rows, time.perf_counter() - start)
+
+        # Reasons are joined only for the failing rows
+        bad = np.zeros(len(df), dtype=bool)
+        for _, failed in reasons:
+            bad |= failed.to_numpy()
+        labels = pd.Series('', index=df.index[bad])
+        for reason, failed in reasons:
+            hits = failed.to_numpy()[bad]
+            labels[hits] = labels[hits] + reason + '; '
+        quarantined = raw[bad].assign(Reasons=labels.str[:-2])
+        if self.quarantine_path is not None:
+            write_quarantine(quarantined, self.quarantine_path)
+        return df[~bad], quarantined
+
+    # Failures and time of every rule over everything validated so far
+    def report(self):
+        actions = {'number': 'quarantine', **{rule.name: rule.action for rule in self.rules}}
+        return pd.DataFrame({
+            'Rule': list(self.seconds),
+            'Action': [actions[name] for name in self.seconds],
+            'Failures': [self.failures[name] for name in self.seconds],
+            'Milliseconds': [self.seconds[name] * 1000 for name in self.seconds],
+        })
+
+
+# Clean a raw export like cleandata.clean_data, with validation after duplicates are removed:
+# rows failing a rule are quarantined instead of being fixed up or dropped
+def clean_validated(df, validator):
+    position = CLEANING_STEPS.index(drop_duplicate_rows) + 1
+    for step in CLEANING_STEPS[:position]:
+        df = step(df)
+    df, _ = validator.validate(df)
+    for step in CLEANING_STEPS[position:]:
+        df = step(df)
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate a YouTube statistics export and quarantine the bad rows.')
+    parser.add_argument('path', nargs='?', default=DATA_PATH, help='CSV export to validate')
+    parser.add_argument('--quarantine', default='quarantine.csv', help='CSV file the bad rows are appended to')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    validator = Validator(args.quarantine)
+    df = clean_validated(read_data(args.path), validator)
+    print(f'{len(df)} clean rows in {time.perf_counter() - start:.2f}s; quarantined rows are in {args.quarantine}')
+    print(validator.report().to_string(index=False))